@@ -2,6 +2,8 @@ from pathlib import Path
 import re
 import platform
 import boto3
+from functools import lru_cache
+from botocore.config import Config
 from io import BytesIO 
 import textractcaller as tc
 from textractprettyprinter.t_pretty_print import get_text_from_layout_json
@@ -147,8 +149,19 @@ def encode_pdf_to_base64(file_path):
         })
     return encoded_messages
 
+# One client reused by every text, vision and tool-use question
+@lru_cache(maxsize=1)
+def get_bedrock_runtime_client():
+    return boto3.client(
+        "bedrock-runtime",
+        config=Config(
+            max_pool_connections=10,
+            retries={"max_attempts": 8, "mode": "adaptive"},
+        ),
+    )
+
 def call_bedrock_model(content: list, system_prompt: str, model_id: str, tool_config: dict = None):
-    bedrock_rt = boto3.client("bedrock-runtime")
+    bedrock_rt = get_bedrock_runtime_client()
     inference_config = {"maxTokens": 4096, "temperature": 0, "topP": 1}
     params = {
         "modelId": model_id,
@@ -2,7 +2,12 @@ from botocore.exceptions import NoCredentialsError
 from awsmanager.manager import AWSClientSession, create_bucket_if_not_exists
 from aoss.permissions import set_permissions
 from aoss.aoss import aoss_creation
-from parameters.parameters import config, PROXY_TEXT_BUCKET, PROXY_PDF_BUCKET
+from parameters.parameters import (
+    config,
+    PROXY_TEXT_BUCKET,
+    PROXY_PDF_BUCKET,
+    create_folders,
+)
 
 
 # Change this to False if you have all permissions set prior
@@ -15,6 +20,7 @@ ACTION = config["runtime_action"]["aoss_action"]
 # username = config["identity_access_role_policy"]["username"]
 role_name = config["identity_access_role_policy"]["role_name"]
 policy_name = config["identity_access_role_policy"]["policy_name"]
+create_folders()
 aws_session = AWSClientSession()
 
 try:
@@ -1,4 +1,3 @@
-import time
 from botocore.exceptions import NoCredentialsError
 from textract.textract_logger import get_logger
 from utils.utils import get_directory_size
@@ -11,12 +10,15 @@ from parameters.parameters import (
     START_YEAR,
     END_YEAR,
     s3_pdf_upload,
+    create_folders,
 )
 from textract.textract_util import PdfTextExtractor
+from textract.textract_scheduler import TextractJobScheduler
 from awsmanager.manager import AWSClientSession
 
 
 logging = get_logger(__name__)
+create_folders()
 aws_session = AWSClientSession()
 try:
     # Step 0 - Upload pdf files to S3 if needed
@@ -32,32 +34,25 @@ try:
             bucket_name=PROXY_PDF_BUCKET,
             file_types=["pdf"],
         )
+        # S3 is strongly read-after-write consistent, Textract can start right away
         uploader.upload_files()
-        if actual_size >= 1024 * 1024:
-            time.sleep(30)
 
     # Step 1 - Extract text from S3 pdf using Textractor
     logging.info("Starting...Step 1 - Extract text from S3 pdf using Textractor")
-    for company in ticker_dict:
-        ticker = ticker_dict[company]
-        for year in range(START_YEAR, END_YEAR + 1, 1):
-            try:
-                extractor = PdfTextExtractor(
-                    session=aws_session,
-                    ticker=ticker,
-                    year=year,
-                    bucket_name=PROXY_PDF_BUCKET,
-                    text_data_path=text_data_path,
-                    profile_name=aws_session.get_profile(),
-                    region_name=aws_session.get_region(),
-                )
-                _, _ = extractor.extract_text()
-                logging.info(f"File {ticker} and {year} processed")
-            except Exception as e:
-                logging.error(f"File {ticker} and {year} might not exist")
-                logging.error(f"Error extracting text from {ticker} {year}")
-                logging.error(f"Resulting in the following error: {e}")
-                continue
+    extractors = [
+        PdfTextExtractor(
+            session=aws_session,
+            ticker=ticker_dict[company],
+            year=year,
+            bucket_name=PROXY_PDF_BUCKET,
+            text_data_path=text_data_path,
+            profile_name=aws_session.get_profile(),
+            region_name=aws_session.get_region(),
+        )
+        for company in ticker_dict
+        for year in range(START_YEAR, END_YEAR + 1, 1)
+    ]
+    TextractJobScheduler().run(extractors)
     logging.info("All run processes completed, please validate results")
 except NoCredentialsError:
     logging.error("Exiting due to credential errors.")
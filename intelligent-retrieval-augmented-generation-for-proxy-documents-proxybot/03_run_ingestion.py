@@ -1,19 +1,19 @@
-import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.exceptions import NoCredentialsError
-from data_pipeline.pipeline import (
-    documents_loading_splitting,
-    create_aoss_indices,
-    bulk_ingest_data,
-)
+from data_pipeline.pipeline import create_aoss_indices, ingest_ticker_year
 from parameters.parameters import (
     text_data_path,
     ticker_dict,
     START_YEAR,
     END_YEAR,
     s3_pdf_upload,
+    aoss_parameters_dict,
+    vector_store_dict,
+    create_folders,
 )
-from awsmanager.manager import AWSClientSession
+from awsmanager.manager import AWSClientSession, bedrock_call_stats
+from logics.aossclient import aoss_client_pool
 from parameters.logger import get_logger
 from awsmanager.s3_manager import FileUploader
 from utils.utils import get_directory_size
@@ -21,7 +21,7 @@ from parameters.parameters import text_data_path, PROXY_TEXT_BUCKET
 
 logging = get_logger(__name__)
 
-documents_dicts = {}
+create_folders()
 aws_session = AWSClientSession()
 
 try:
@@ -43,39 +43,47 @@ try:
             file_types=["txt"],
         )
         uploader.upload_files()
-        if actual_size >= 1024 * 1024:
-            # Allows for 30s rest from the AOSS collection set
-            time.sleep(20)
 
     # Step 2 - Data Ingestion to AOSS
     print("Executing...Step 2 - Data Ingestion to AOSS")
-    for company in ticker_dict:
-        ticker = ticker_dict[company]
-        for year in range(START_YEAR, END_YEAR + 1, 1):
-            data_source = os.path.join(text_data_path, ticker)
-            data_source = f"text_data/{ticker}"
-            print(data_source)
-            documents_dicts[ticker] = documents_loading_splitting(
-                docs_source=data_source, ticker=ticker, document_date=year
+    ingestion_workers = aoss_parameters_dict["ingestion_workers"]
+    ingestion_start = time.time()
+    unit_summaries = []
+    with ThreadPoolExecutor(max_workers=ingestion_workers) as executor:
+        futures = {
+            executor.submit(ingest_ticker_year, aws_session, ticker, year): (
+                ticker,
+                year,
             )
+            for ticker in ticker_dict.values()
+            for year in range(START_YEAR, END_YEAR + 1, 1)
+        }
+        for future in as_completed(futures):
+            ticker, year = futures[future]
             try:
-                data_source = os.path.join(text_data_path, ticker)
-                data_source = f"text_data/{ticker}"
-                print(data_source)
-                documents_dicts[ticker] = documents_loading_splitting(
-                    docs_source=data_source, ticker=ticker, document_date=year
-                )
-                bulk_ingest_data(
-                    aws_session,
-                    input_docs=documents_dicts[ticker],
-                    ticker=ticker,
-                    document_date=year,
-                )
+                unit_summaries.append(future.result())
             except Exception as e:
                 logging.error(f"File {ticker} and {year} might not exist")
                 logging.error(f"Error extracting text from {ticker} {year}")
                 logging.error(f"Resulting in following error: {e}")
                 continue
+
+    logging.info(
+        f"Ingestion of {len(futures)} ticker/year units with {ingestion_workers} "
+        f"workers took {time.time() - ingestion_start:.2f}s"
+    )
+    for summary in sorted(
+        unit_summaries, key=lambda item: (item["ticker"], item["document_date"])
+    ):
+        logging.info(
+            f"{summary['ticker']} {summary['document_date']}: "
+            f"{summary['chunks']} chunks, {summary.get('indexed', 0)} indexed, "
+            f"{summary.get('failed', 0)} failed, load {summary['load_seconds']}s, "
+            f"ingest {summary['ingest_seconds']}s, total {summary['total_seconds']}s"
+        )
+    logging.info(f"Bedrock client stats: {bedrock_call_stats.stats()}")
+    if vector_store_dict["backend"] == "aoss":
+        logging.info(f"OpenSearch connection reuse: {aoss_client_pool.stats()}")
     logging.info("All run processes completed, please validate results")
 
 except NoCredentialsError:
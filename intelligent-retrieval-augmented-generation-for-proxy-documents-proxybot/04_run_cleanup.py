@@ -9,6 +9,7 @@ from parameters.parameters import (
     PROXY_PDF_BUCKET,
     text_data_path,
     key_folder,
+    create_folders,
 )
 from utils.utils import delete_folder
 
@@ -25,6 +26,7 @@ username = config["identity_access_role_policy"]["username"]
 role_name = config["identity_access_role_policy"]["role_name"]
 policy_name = config["identity_access_role_policy"]["policy_name"]
 
+create_folders()
 aws_session = AWSClientSession()
 asm = AWSSecretsManager(aws_session)
 
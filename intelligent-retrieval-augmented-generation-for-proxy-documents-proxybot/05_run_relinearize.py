@@ -0,0 +1,46 @@
+from textract.textract_logger import get_logger
+from parameters.parameters import (
+    text_data_path,
+    PROXY_PDF_BUCKET,
+    ticker_dict,
+    START_YEAR,
+    END_YEAR,
+    create_folders,
+)
+from textract.textract_util import PdfTextExtractor
+from awsmanager.manager import AWSClientSession
+
+
+# Rebuilds `text_data/` from the raw Textract analyses cached by 02_run_textract.py,
+# e.g. after a change to the linearization config or the markdown header split.
+# Textract is never invoked, units without a cached analysis are skipped.
+logging = get_logger(__name__)
+create_folders()
+aws_session = AWSClientSession()
+
+for company in ticker_dict:
+    ticker = ticker_dict[company]
+    for year in range(START_YEAR, END_YEAR + 1, 1):
+        try:
+            extractor = PdfTextExtractor(
+                session=aws_session,
+                ticker=ticker,
+                year=year,
+                bucket_name=PROXY_PDF_BUCKET,
+                text_data_path=text_data_path,
+                profile_name=aws_session.get_profile(),
+                region_name=aws_session.get_region(),
+            )
+            document = extractor.load_cached_analysis()
+            if document is None:
+                logging.info(f"No cached Textract analysis for {ticker} {year}")
+                continue
+            md_header_splits = extractor.linearize(document)
+            logging.info(
+                f"File {ticker} and {year} re-linearized into "
+                f"{len(md_header_splits)} sections"
+            )
+        except Exception as e:
+            logging.error(f"Error re-linearizing {ticker} {year}: {e}")
+            continue
+logging.info("Re-linearization completed, please validate results")
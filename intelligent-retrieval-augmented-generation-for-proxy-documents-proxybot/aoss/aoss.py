@@ -1,9 +1,14 @@
 import botocore
 import json
-import time
 from opensearchpy import AWSV4SignerAuth
 from aoss.aoss_logger import get_logger
-from parameters.parameters import log_files_dict, config, aoss_params
+from parameters.parameters import (
+    log_files_dict,
+    config,
+    aoss_params,
+    aoss_parameters_dict,
+)
+from utils.utils import wait_until
 from awsmanager.manager import AWSSecretsManager
 
 
@@ -97,18 +102,24 @@ def aoss_create_network_security_policy(
 
 def aoss_wait_for_collection_activation(session, vector_store_name):
     aoss_client = session.get_aoss_client()
-    while True:
-        try:
-            logging.info("Checking collection activation")
-            status = aoss_client.list_collections(
-                collectionFilters={"name": vector_store_name}
-            )["collectionSummaries"][0]["status"]
-            if status in ("ACTIVE", "FAILED"):
-                break
-            time.sleep(30)
-        except Exception as e:
-            logging.error(f"Error while waiting for collection activation: {e}")
-            pass
+
+    def collection_status():
+        logging.info("Checking collection activation")
+        status = aoss_client.list_collections(
+            collectionFilters={"name": vector_store_name}
+        )["collectionSummaries"][0]["status"]
+        return status if status in ("ACTIVE", "FAILED") else None
+
+    status = wait_until(
+        collection_status,
+        f"AOSS collection {vector_store_name}",
+        timeout=aoss_parameters_dict["readiness_timeout"],
+        max_delay=aoss_parameters_dict["readiness_max_delay"],
+        retry_on=(botocore.exceptions.ClientError,),
+    )
+    if status == "FAILED":
+        raise RuntimeError(f"AOSS collection {vector_store_name} failed to activate")
+    return status
 
 
 def aoss_create_access_policy(session, access_policy_name, vector_store_name):
@@ -118,14 +129,7 @@ def aoss_create_access_policy(session, access_policy_name, vector_store_name):
     account_id = sts_client.get_caller_identity()["Account"]
     role_identity = f"arn:aws:iam::{account_id}:role/Admin"
     try:
-        logging.info("Checking collection activation...")
-        while True:
-            status = aoss_client.list_collections(
-                collectionFilters={"name": vector_store_name}
-            )["collectionSummaries"][0]["status"]
-            if status in ("ACTIVE", "FAILED"):
-                break
-            time.sleep(30)
+        aoss_wait_for_collection_activation(session, vector_store_name)
         logging.info(f"Creating access policy {access_policy_name}...")
         response = aoss_client.create_access_policy(
             description="Data access policy for AOSS collection",
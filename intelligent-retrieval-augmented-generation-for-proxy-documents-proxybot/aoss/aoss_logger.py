@@ -1,6 +1,7 @@
 import sys
 import logging
 from parameters.parameters import log_files_dict
+from parameters.logger import DelayedFileHandler
 
 formatter = logging.Formatter(
     "%(asctime)s: %(levelname)s [line: %(lineno)d, sourcefile: %(name)s'] %(message)s",
@@ -15,7 +16,7 @@ def get_console_handler():
 
 
 def get_file_handler():
-    file_handler = logging.FileHandler(log_files_dict["aoss_log"])
+    file_handler = DelayedFileHandler(log_files_dict["aoss_log"])
     file_handler.setFormatter(formatter)
     return file_handler
 
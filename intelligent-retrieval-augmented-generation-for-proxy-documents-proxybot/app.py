@@ -10,14 +10,22 @@ from parameters.parameters import (
     models_list,
     PROXY_TEXT_BUCKET,
     START_YEAR,
+    create_folders,
 )
 from parameters.logger import get_logger
 from awsmanager.manager import AWSClientSession
+from awsmanager.registry import registry
 
 
 logging = get_logger(__name__)
 
+create_folders()
 aws_session = AWSClientSession()
+# Clients are created on first use, start them while the page renders
+registry.warm_up(
+    ["bedrock_runtime", "embedding_cache", "vector_store", "source_cache"],
+    background=True,
+)
 
 st.set_page_config(page_title="ProxyBot App", page_icon="💰", layout="wide")
 st.markdown(
@@ -174,7 +182,16 @@ if prompt := st.chat_input(
             st.session_state.document_date,
             st.session_state.company,
             st.session_state.model,
+            stream=True,
         )
+    # Render the answer as it is generated, the sources are added once it is complete
+    answer_placeholder = st.chat_message("assistant").empty()
+    streamed_answer = ""
+    for answer_chunk in msg["answer"]:
+        streamed_answer += answer_chunk
+        answer_placeholder.markdown(f"{streamed_answer}▌", unsafe_allow_html=True)
+    msg["answer"] = streamed_answer
+    with st.spinner("Adding sources"):
         ticker = ticker_dict[st.session_state.company]
         main_sources = msg["source"]
         updated_main_sources = []
@@ -223,7 +240,7 @@ if prompt := st.chat_input(
             """
         disabled(False)
     st.session_state.messages.append({"role": "assistant", "content": msg_html})
-    st.chat_message("assistant").markdown(msg_html, unsafe_allow_html=True)
+    answer_placeholder.markdown(msg_html, unsafe_allow_html=True)
     st.rerun()
 
 hide_st_style = """
@@ -1,29 +1,72 @@
 import json
 from parameters.logger import get_logger
-from parameters.parameters import config
-from langchain_community.embeddings import BedrockEmbeddings
+from parameters.parameters import config, embedding_cache_dict
 from awsmanager.manager import AWSClientSession
+from awsmanager.embedding_cache import EmbeddingCache
+from awsmanager.registry import registry
 
 logging = get_logger(__name__)
 
-try:
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+
+def create_bedrock_client():
     bedrock_client = AWSClientSession().get_bedrock_client(runtime=True)
-except Exception as error:
-    print(f"Error creating bedrock client: {error}")
-    bedrock_client = None
-
-bedrock_embeddings = BedrockEmbeddings(
-    model_id="amazon.titan-embed-text-v1",
-    client=bedrock_client,
-    region_name=config["aws_params"]["region_name"],
+    if bedrock_client is None:
+        # Raised so that the registry tries again on the next get()
+        raise RuntimeError("Could not create the bedrock runtime client, see the log")
+    return bedrock_client
+
+
+def create_bedrock_embeddings():
+    # langchain is slow to import and only needed by the ingestion
+    from langchain_community.embeddings import BedrockEmbeddings
+
+    return BedrockEmbeddings(
+        model_id=EMBEDDING_MODEL_ID,
+        client=get_bedrock_client(),
+        region_name=config["aws_params"]["region_name"],
+    )
+
+
+registry.register("bedrock_runtime", create_bedrock_client)
+registry.register("bedrock_embeddings", create_bedrock_embeddings)
+registry.register(
+    "embedding_cache",
+    lambda: EmbeddingCache(
+        embedding_cache_dict["db_path"], embedding_cache_dict["max_size_mb"]
+    ),
 )
 
 
-def get_text_embedding(body, bedrock_client, model_id="amazon.titan-embed-text-v1"):
+def get_bedrock_client():
+    return registry.get("bedrock_runtime")
+
+
+def get_bedrock_embeddings():
+    return registry.get("bedrock_embeddings")
+
+
+def get_embedding_cache():
+    if not embedding_cache_dict["enabled"]:
+        return None
+    return registry.get("embedding_cache")
+
+
+def get_text_embedding(body, bedrock_client, model_id=EMBEDDING_MODEL_ID):
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        input_text = json.loads(body).get("inputText", "")
+        embedding = embedding_cache.get(model_id, input_text)
+        if embedding is not None:
+            return embedding
     response = bedrock_client.invoke_model(
         body=body,
         modelId=model_id,
         accept="application/json",
         contentType="application/json",
     )
-    return json.loads(response.get("body").read()).get("embedding")
+    embedding = json.loads(response.get("body").read()).get("embedding")
+    if embedding_cache is not None and embedding:
+        embedding_cache.put(model_id, input_text, embedding)
+    return embedding
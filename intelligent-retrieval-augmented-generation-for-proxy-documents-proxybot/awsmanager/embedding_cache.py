@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from parameters.logger import get_logger
+from parameters.parameters import check_folder_exists
+
+
+logging = get_logger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, db_path, max_size_mb=512):
+        """
+        Persistent embedding cache stored in SQLite as float32 blobs.
+        Entries are keyed by (model_id, sha256(text)) and the least recently
+        used entries are evicted once the stored vectors exceed max_size_mb.
+        :param db_path: path of the SQLite database file
+        :param max_size_mb: maximum size of the stored embeddings in MB
+        """
+        self.db_path = db_path
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        check_folder_exists(os.path.dirname(db_path))
+        self.connection = sqlite3.connect(
+            db_path, timeout=30, check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model_id TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model_id, text_hash)
+                )
+                """
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_access "
+                "ON embeddings (last_access)"
+            )
+            self.total_bytes = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _to_blob(embedding):
+        return array("f", embedding).tobytes()
+
+    @staticmethod
+    def _from_blob(blob):
+        embedding = array("f")
+        embedding.frombytes(blob)
+        return embedding.tolist()
+
+    def get(self, model_id, text):
+        text_hash = self.text_hash(text)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT embedding FROM embeddings WHERE model_id = ? AND text_hash = ?",
+                (model_id, text_hash),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE embeddings SET last_access = ? "
+                    "WHERE model_id = ? AND text_hash = ?",
+                    (time.time(), model_id, text_hash),
+                )
+        return self._from_blob(row[0])
+
+    def put(self, model_id, text, embedding):
+        self.put_many([(model_id, self.text_hash(text), embedding)])
+
+    def put_many(self, records):
+        """
+        Store many embeddings in a single transaction.
+        :param records: iterable of (model_id, text_hash, embedding)
+        :return: number of records stored
+        """
+        now = time.time()
+        rows = []
+        for model_id, text_hash, embedding in records:
+            blob = self._to_blob(embedding)
+            rows.append((model_id, text_hash, blob, len(blob), now))
+        if not rows:
+            return 0
+        with self.lock:
+            with self.connection:
+                for row in rows:
+                    previous = self.connection.execute(
+                        "SELECT size FROM embeddings WHERE model_id = ? AND text_hash = ?",
+                        row[:2],
+                    ).fetchone()
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", row
+                    )
+                    self.total_bytes += row[3] - (previous[0] if previous else 0)
+            self._evict()
+        return len(rows)
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its limit."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target_bytes = int(self.max_bytes * 0.9)
+        with self.connection:
+            while self.total_bytes > target_bytes:
+                rows = self.connection.execute(
+                    "SELECT model_id, text_hash, size FROM embeddings "
+                    "ORDER BY last_access LIMIT 500"
+                ).fetchall()
+                if not rows:
+                    self.total_bytes = 0
+                    break
+                for model_id, text_hash, size in rows:
+                    self.connection.execute(
+                        "DELETE FROM embeddings WHERE model_id = ? AND text_hash = ?",
+                        (model_id, text_hash),
+                    )
+                    self.total_bytes -= size
+                    self.evictions += 1
+                    if self.total_bytes <= target_bytes:
+                        break
+        logging.info(f"Embedding cache evicted entries, now {self.total_bytes} bytes")
+
+    def warm_up(self, records):
+        """
+        Bulk import embeddings computed elsewhere, e.g. exported from an existing index.
+        :param records: iterable of (model_id, text, embedding)
+        :return: number of records imported
+        """
+        imported = self.put_many(
+            (model_id, self.text_hash(text), embedding)
+            for model_id, text, embedding in records
+        )
+        logging.info(f"Embedding cache warmed up with {imported} embeddings")
+        return imported
+
+    def warm_up_from_jsonl(self, file_path):
+        """Bulk import a JSON lines file of {"model_id", "text", "embedding"} records."""
+        with open(file_path, "r", encoding="utf-8") as file:
+            records = (json.loads(line) for line in file if line.strip())
+            return self.warm_up(
+                (record["model_id"], record["text"], record["embedding"])
+                for record in records
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self.total_bytes,
+        }
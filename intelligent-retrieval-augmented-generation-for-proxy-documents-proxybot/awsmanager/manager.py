@@ -1,34 +1,122 @@
 import boto3
 import json
+import time
+import threading
+from collections import Counter
 from botocore.exceptions import ClientError
 from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
+from botocore.session import get_session as get_botocore_session
 from parameters.logger import get_logger
-from parameters.parameters import config, aws_profile
+from parameters.parameters import (
+    config,
+    aws_profile,
+    aws_clients_dict,
+    setup_default_boto3_session,
+)
 
 logging = get_logger(__name__)
 
+SECRET_TTL_SECONDS = aws_clients_dict["secret_ttl_seconds"]
+
+# Secret values shared by all AWSSecretsManager instances, {secret_name: (value, fetched_at)}
+secret_cache = {}
+secret_cache_lock = threading.Lock()
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ModelNotReadyException",
+}
+
+
+class ClientCallStats:
+    def __init__(self):
+        """
+        Call, retry and throttling counters of the clients it is registered on,
+        collected through the botocore event hooks.
+        """
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def register(self, client):
+        service = client.meta.service_model.service_id.hyphenize()
+        # First so that it sees every attempt, the retry handler stops the event
+        client.meta.events.register_first(f"needs-retry.{service}", self.on_attempt)
+        client.meta.events.register(f"after-call.{service}", self.on_call)
+        client.meta.events.register(f"after-call-error.{service}", self.on_call_error)
+
+    def on_attempt(self, response=None, caught_exception=None, **kwargs):
+        if caught_exception is not None:
+            self.increment("connection_errors")
+        elif response is not None:
+            error_code = response[1].get("Error", {}).get("Code")
+            if error_code in THROTTLING_ERROR_CODES or response[0].status_code == 429:
+                self.increment("throttles")
+
+    def on_call(self, http_response=None, parsed=None, **kwargs):
+        response_metadata = (parsed or {}).get("ResponseMetadata", {})
+        self.increment("calls")
+        self.increment("retries", response_metadata.get("RetryAttempts", 0))
+        if http_response is not None and http_response.status_code >= 300:
+            self.increment("errors")
+
+    def on_call_error(self, **kwargs):
+        self.increment("calls")
+        self.increment("errors")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+bedrock_call_stats = ClientCallStats()
+
 
 class AWSResourceManager:
     aws_session = None
+    session_lock = threading.Lock()
 
     @classmethod
     def initialise_session(cls):
+        setup_default_boto3_session()
         use_temporary_credentials = config.getboolean(
             "aws_params", "use_temporary_credentials", fallback=False
         )
         if use_temporary_credentials:
-            # Temporary credentials using STS - Not used
+            # Temporary credentials using STS, assumed again before they expire
             role_arn = config.get("aws_params", "role_arn")
             role_session_name = config.get("aws_params", "role_session_name")
             sts = boto3.client("sts")
-            assumed_role_object = sts.assume_role(
-                RoleArn=role_arn, RoleSessionName=role_session_name
+
+            def assume_role():
+                assumed_role_object = sts.assume_role(
+                    RoleArn=role_arn, RoleSessionName=role_session_name
+                )
+                credentials = assumed_role_object["Credentials"]
+                logging.info(
+                    f"Assumed role {role_arn} until {credentials['Expiration']}"
+                )
+                return {
+                    "access_key": credentials["AccessKeyId"],
+                    "secret_key": credentials["SecretAccessKey"],
+                    "token": credentials["SessionToken"],
+                    "expiry_time": credentials["Expiration"].isoformat(),
+                }
+
+            botocore_session = get_botocore_session()
+            botocore_session._credentials = RefreshableCredentials.create_from_metadata(
+                metadata=assume_role(),
+                refresh_using=assume_role,
+                method="sts-assume-role",
             )
-            credentials = assumed_role_object["Credentials"]
             cls.aws_session = boto3.Session(
-                aws_access_key_id=credentials["AccessKeyId"],
-                aws_secret_access_key=credentials["SecretAccessKey"],
-                aws_session_token=credentials["SessionToken"],
+                botocore_session=botocore_session,
                 region_name=config.get("aws_params", "region_name"),
             )
         elif aws_profile == None:
@@ -41,7 +129,9 @@ class AWSResourceManager:
     @classmethod
     def get_session(cls):
         if cls.aws_session is None:
-            cls.initialise_session()
+            with cls.session_lock:
+                if cls.aws_session is None:
+                    cls.initialise_session()
         return cls.aws_session
 
 
@@ -57,13 +147,22 @@ class AWSClientSession:
     def get_aoss_client(self):
         return self.session.client("opensearchserverless")
 
-    def get_s3_client(self):
+    def get_s3_client(self, max_pool_connections=None):
+        if max_pool_connections:
+            return self.session.client(
+                "s3", config=Config(max_pool_connections=max_pool_connections)
+            )
         return self.session.client("s3")
 
     def get_sts_client(self):
         return self.session.client("sts")
 
     def obtain_credentials(self):
+        """
+        Return the credentials object of the session, not a snapshot of its keys.
+        Refreshable credentials (assumed role, SSO, instance profile) renew themselves
+        when read, so long-lived signers never have to be rebuilt.
+        """
         return self.session.get_credentials()
 
     def get_secrets_manager(self):
@@ -76,10 +175,18 @@ class AWSClientSession:
         return self.session.profile_name
 
     def get_bedrock_client(self, runtime=False):
+        """
+        Create a Bedrock client. Runtime clients are meant to be shared, see
+        awsmanager.bedrock.get_bedrock_client, so the connection pool is sized for all
+        worker threads and retries use the adaptive mode. Calls, retries and throttles
+        are counted in bedrock_call_stats.
+        """
         retry_config = Config(
+            max_pool_connections=aws_clients_dict["bedrock_max_pool_connections"],
+            tcp_keepalive=True,
             retries={
-                "max_attempts": 8,
-                "mode": "standard",
+                "max_attempts": aws_clients_dict["bedrock_max_attempts"],
+                "mode": aws_clients_dict["bedrock_retry_mode"],
             },
         )
         if runtime:
@@ -91,6 +198,7 @@ class AWSClientSession:
             bedrock = self.session.client(
                 service_name=service_name, config=retry_config
             )
+            bedrock_call_stats.register(bedrock)
             logging.info(f"Bedrock client created")
             if not runtime:
                 logging.info("Not using runtime")
@@ -104,7 +212,14 @@ class AWSClientSession:
 class AWSSecretsManager:
     def __init__(self, session):
         self.session = session
-        self.secrets_client = session.get_secrets_manager()
+        self.client = None
+
+    @property
+    def secrets_client(self):
+        # Created on first use, cached secret lookups never need it
+        if self.client is None:
+            self.client = self.session.get_secrets_manager()
+        return self.client
 
     def load_credentials_from_json(self, json_file_path):
         if json_file_path:
@@ -127,6 +242,8 @@ class AWSSecretsManager:
                 SecretId=secret_name, SecretString=json.dumps(secret_data)
             )
             logging.info(f"Updated secret: {secret_name}")
+        with secret_cache_lock:
+            secret_cache.pop(secret_name, None)
 
     def check_secret_exists(self, secret_name):
         try:
@@ -146,12 +263,25 @@ class AWSSecretsManager:
                 aws_credentials = self.load_credentials_from_json(json_file_path)
                 self.create_or_update_secret(secret_name, aws_credentials)
 
-    def get_secret_credentials(self, aws_secret_name):
+    def get_secret_credentials(self, aws_secret_name, ttl_seconds=SECRET_TTL_SECONDS):
+        """
+        Return the secret value, read from Secrets Manager at most once per ttl_seconds.
+        :param aws_secret_name: secret name, prefixed with the profile name
+        :param ttl_seconds: age after which the cached value is fetched again
+        """
         if self.session.get_profile():
             secret_name = f"{self.session.get_profile()}/{aws_secret_name}"
+            with secret_cache_lock:
+                cached = secret_cache.get(secret_name)
+            if cached is not None and time.time() - cached[1] < ttl_seconds:
+                return cached[0]
             if self.check_secret_exists(secret_name):
                 secret = self.secrets_client.get_secret_value(SecretId=secret_name)
-                return json.loads(secret["SecretString"])
+                value = json.loads(secret["SecretString"])
+                with secret_cache_lock:
+                    secret_cache[secret_name] = (value, time.time())
+                logging.info(f"Fetched secret {secret_name}, cached for {ttl_seconds}s")
+                return value
         return None
 
     def delete_secret(self, aws_secret_name):
@@ -170,6 +300,8 @@ class AWSSecretsManager:
                 SecretId=secret_name, ForceDeleteWithoutRecovery=True
             )
             logging.info(f"Deleted secret: {secret_name}")
+            with secret_cache_lock:
+                secret_cache.pop(secret_name, None)
         except Exception as error:
             logging.error(f"Error deleting secret: {error}")
 
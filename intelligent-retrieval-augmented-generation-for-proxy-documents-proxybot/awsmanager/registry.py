@@ -0,0 +1,90 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from parameters.logger import get_logger
+
+
+logging = get_logger(__name__)
+
+
+class ServiceRegistry:
+    def __init__(self):
+        """
+        Process-wide registry of lazily created services such as AWS clients.
+        Modules register a factory under a name at import time, which costs nothing,
+        and the service is created on its first get(), once, even when several
+        threads ask for it at the same time. A factory raising or returning None
+        leaves the service uncreated, the next get() tries again.
+        """
+        self.factories = {}
+        self.services = {}
+        self.locks = {}
+        self.creation_seconds = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, factory):
+        """
+        :param name: name of the service
+        :param factory: callable without arguments creating the service
+        """
+        with self.lock:
+            self.factories[name] = factory
+            self.locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        service = self.services.get(name)
+        if service is not None:
+            return service
+        if name not in self.factories:
+            raise KeyError(f"No service registered as {name}")
+        with self.locks[name]:
+            if name not in self.services:
+                start_time = time.time()
+                service = self.factories[name]()
+                # Never cached, the next get() calls the factory again
+                if service is None:
+                    raise RuntimeError(f"Factory of service {name} returned None")
+                self.services[name] = service
+                self.creation_seconds[name] = round(time.time() - start_time, 3)
+                logging.info(
+                    f"Created service {name} in {self.creation_seconds[name]}s"
+                )
+        return self.services[name]
+
+    def reset(self, name):
+        """Drop a created service, the next get() creates it again."""
+        with self.locks.get(name, self.lock):
+            self.services.pop(name, None)
+
+    def warm_up(self, names=None, background=False):
+        """
+        Create services ahead of their first use, concurrently.
+        Failures are logged, the service is then created again on its first get().
+        :param names: services to create, all registered services when None
+        :param background: return immediately and create the services in a thread
+        """
+        names = list(self.factories) if names is None else names
+
+        def create(name):
+            try:
+                self.get(name)
+            except Exception as error:
+                logging.error(f"Could not warm up service {name}: {error}")
+
+        def create_all():
+            with ThreadPoolExecutor(max_workers=max(len(names), 1)) as executor:
+                list(executor.map(create, names))
+
+        if background:
+            threading.Thread(target=create_all, daemon=True).start()
+        else:
+            create_all()
+
+    def stats(self):
+        return {
+            "registered": sorted(self.factories),
+            "created": dict(self.creation_seconds),
+        }
+
+
+registry = ServiceRegistry()
@@ -1,10 +1,16 @@
 import io
 import os
 import json
+import time
+import hashlib
 import PyPDF2
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError, ClientError
 from parameters.logger import get_logger
+from parameters.parameters import s3_transfer_dict
+from utils.utils import human_readable_size
 
 
 logging = get_logger(__name__)
@@ -59,18 +65,35 @@ class FileReader:
 
 
 class FileUploader:
-    def __init__(self, session, local_directory, bucket_name, file_types=None):
+    def __init__(
+        self,
+        session,
+        local_directory,
+        bucket_name,
+        file_types=None,
+        max_workers=s3_transfer_dict["upload_workers"],
+    ):
         """
         Initialize the uploader with directory, bucket and file types.
         :param local_directory: Directory to upload files from.
         :param bucket_name: S3 bucket name to upload files to.
         :param file_types: List of file extensions to upload, e.g., ['pdf', 'jpg']. If None, all files are uploaded.
+        :param max_workers: Number of files uploaded in parallel.
         """
         self.session = session
         self.local_directory = local_directory
         self.bucket_name = bucket_name
         self.file_types = file_types if file_types is not None else []
-        self.s3_client = session.get_s3_client()
+        self.max_workers = max_workers
+        self.transfer_config = TransferConfig(
+            multipart_threshold=s3_transfer_dict["multipart_threshold"],
+            multipart_chunksize=s3_transfer_dict["multipart_chunksize"],
+            max_concurrency=s3_transfer_dict["max_concurrency"],
+            use_threads=True,
+        )
+        self.s3_client = session.get_s3_client(
+            max_pool_connections=max_workers * s3_transfer_dict["max_concurrency"]
+        )
         self.ensure_bucket_exists()
 
     def ensure_bucket_exists(self):
@@ -86,15 +109,77 @@ class FileUploader:
                 raise
 
     def upload_files(self):
-        """Walk through the local directory and upload specified file types to S3."""
+        """Walk through the local directory and upload new or changed files of the specified types to S3."""
+        start_time = time.time()
+        existing_objects = self.list_existing_objects()
+        to_upload = []
+        skipped = 0
         for root, dirs, files in os.walk(self.local_directory):
             for file in files:
                 if self.should_upload_file(file):
                     local_path = os.path.join(root, file)
                     relative_path = os.path.relpath(local_path, self.local_directory)
                     s3_path = relative_path.replace(os.sep, "/")
-                    print(s3_path)
-                    self.upload_file_to_s3(local_path, s3_path)
+                    if self.is_unchanged(local_path, existing_objects.get(s3_path)):
+                        skipped += 1
+                    else:
+                        to_upload.append((local_path, s3_path))
+
+        uploaded_bytes = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.upload_file_to_s3, local_path, s3_path)
+                for local_path, s3_path in to_upload
+            ]
+            for future, (local_path, _) in zip(futures, to_upload):
+                if future.result():
+                    uploaded_bytes += os.path.getsize(local_path)
+                else:
+                    failed += 1
+        elapsed_time = time.time() - start_time
+        logging.info(
+            f"Uploaded {len(to_upload) - failed} files "
+            f"({human_readable_size(uploaded_bytes)}) to s3://{self.bucket_name} in "
+            f"{elapsed_time:.2f}s ({human_readable_size(uploaded_bytes / max(elapsed_time, 1e-6))}/s), "
+            f"skipped {skipped} unchanged, {failed} failed"
+        )
+        return {"uploaded": len(to_upload) - failed, "skipped": skipped, "failed": failed}
+
+    def list_existing_objects(self):
+        """Return a dict of key to (size, ETag) for the objects already in the bucket."""
+        existing_objects = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for obj in page.get("Contents", []):
+                existing_objects[obj["Key"]] = (obj["Size"], obj["ETag"].strip('"'))
+        return existing_objects
+
+    def is_unchanged(self, local_path, existing_object):
+        """Check whether the local file has the same size and ETag as the existing S3 object."""
+        if existing_object is None:
+            return False
+        size, etag = existing_object
+        if os.path.getsize(local_path) != size:
+            return False
+        return self.compute_etag(local_path, multipart="-" in etag) == etag
+
+    def compute_etag(self, local_path, multipart=False):
+        """
+        Compute the ETag S3 assigns to the file: the MD5 for single part uploads and the MD5
+        of the part MD5s suffixed with the part count for multipart uploads.
+        """
+        chunk_size = self.transfer_config.multipart_chunksize
+        file_digest = hashlib.md5()  # nosec - ETag comparison, not security
+        part_digests = []
+        with open(local_path, "rb") as file:
+            for block in iter(lambda: file.read(chunk_size), b""):
+                file_digest.update(block)
+                part_digests.append(hashlib.md5(block).digest())  # nosec
+        if not multipart:
+            return file_digest.hexdigest()
+        multipart_digest = hashlib.md5(b"".join(part_digests))  # nosec
+        return f"{multipart_digest.hexdigest()}-{len(part_digests)}"
 
     def should_upload_file(self, file_name):
         """Check if a file matches the specified file types to be uploaded."""
@@ -106,10 +191,16 @@ class FileUploader:
     def upload_file_to_s3(self, local_path, s3_path):
         """Upload a single file to S3."""
         try:
-            self.s3_client.upload_file(local_path, self.bucket_name, s3_path)
+            self.s3_client.upload_file(
+                local_path, self.bucket_name, s3_path, Config=self.transfer_config
+            )
             logging.info(f"Uploaded {local_path} to s3://{self.bucket_name}/{s3_path}")
+            return True
         except NoCredentialsError:
             logging.error("Credentials not available for AWS S3.")
+        except Exception as e:
+            logging.error(f"Failed to upload {local_path}: {str(e)}")
+        return False
 
 
 def generate_presigned_url(session, bucket_name, object_name, expiration=3600):
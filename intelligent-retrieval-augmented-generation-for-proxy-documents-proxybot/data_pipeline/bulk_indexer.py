@@ -0,0 +1,145 @@
+import json
+import time
+import random
+from opensearchpy import exceptions
+from parameters.logger import get_logger
+from parameters.parameters import aoss_parameters_dict
+
+
+logging = get_logger(__name__)
+
+BULK_LIMIT = aoss_parameters_dict["bulk_limit"]
+BULK_MAX_BYTES = aoss_parameters_dict["bulk_max_bytes"]
+BULK_MAX_RETRIES = aoss_parameters_dict["bulk_max_retries"]
+BULK_BACKOFF_SECONDS = aoss_parameters_dict["bulk_backoff_seconds"]
+
+# Item statuses worth re-sending, anything else is a permanent rejection
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class BulkIndexer:
+    def __init__(
+        self,
+        aoss_client,
+        aoss_index,
+        bulk_limit=BULK_LIMIT,
+        max_bytes=BULK_MAX_BYTES,
+        max_retries=BULK_MAX_RETRIES,
+        backoff_seconds=BULK_BACKOFF_SECONDS,
+    ):
+        """
+        Stream documents to AOSS in bulk requests bounded by count and payload size.
+        :param aoss_client: OpenSearch client
+        :param aoss_index: index name
+        :param bulk_limit: maximum number of operations per bulk request
+        :param max_bytes: maximum payload size in bytes per bulk request
+        :param max_retries: number of times rejected items are re-sent
+        :param backoff_seconds: base delay of the exponential backoff between retries
+        """
+        self.aoss_client = aoss_client
+        self.aoss_index = aoss_index
+        self.bulk_limit = bulk_limit
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.pending = []
+        self.pending_bytes = 0
+        self.indexed = 0
+        self.deleted = 0
+        self.failed = 0
+        self.errors = []
+        self.requests = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def index(self, document):
+        self._add({"index": {"_index": self.aoss_index}}, document)
+
+    def delete(self, document_id):
+        self._add({"delete": {"_index": self.aoss_index, "_id": document_id}})
+
+    def _add(self, action, document=None):
+        lines = [json.dumps(action)]
+        if document is not None:
+            lines.append(json.dumps(document))
+        payload = "\n".join(lines) + "\n"
+        payload_bytes = len(payload.encode("utf-8"))
+        if self.pending and (
+            len(self.pending) >= self.bulk_limit
+            or self.pending_bytes + payload_bytes > self.max_bytes
+        ):
+            self.flush()
+        self.pending.append((action, payload))
+        self.pending_bytes += payload_bytes
+
+    def flush(self):
+        if not self.pending:
+            return
+        operations = self.pending
+        self.pending = []
+        self.pending_bytes = 0
+        for attempt in range(self.max_retries + 1):
+            operations = self._send(operations)
+            if not operations:
+                return
+            if attempt < self.max_retries:
+                delay = self.backoff_seconds * 2**attempt
+                delay += random.uniform(0, delay / 2)  # nosec - jitter only
+                logging.info(
+                    f"Retrying {len(operations)} rejected bulk items in {delay:.1f}s"
+                )
+                time.sleep(delay)
+        self.failed += len(operations)
+        logging.error(
+            f"{len(operations)} bulk items failed after {self.max_retries} retries"
+        )
+
+    def _send(self, operations):
+        """Send one bulk request and return the operations that should be retried."""
+        body = "".join(payload for _, payload in operations)
+        self.requests += 1
+        try:
+            response = self.aoss_client.bulk(body=body)
+        except exceptions.TransportError as error:
+            # Connection errors carry no HTTP status and are always retried
+            status = error.status_code if isinstance(error.status_code, int) else 503
+            if status in RETRYABLE_STATUSES:
+                logging.error(f"Bulk request failed, will retry: {error}")
+                return operations
+            self._record_failure(len(operations), str(error))
+            return []
+        logging.info(
+            f"Bulk request sent with {len(operations)} items "
+            f"({len(body.encode('utf-8'))} bytes)"
+        )
+        retry_operations = []
+        for operation, item in zip(operations, response.get("items", [])):
+            op_type, result = next(iter(item.items()))
+            status = result.get("status", 200)
+            if status < 300 or (op_type == "delete" and status == 404):
+                if op_type == "delete":
+                    self.deleted += 1
+                else:
+                    self.indexed += 1
+            elif status in RETRYABLE_STATUSES:
+                retry_operations.append(operation)
+            else:
+                self._record_failure(1, result.get("error"))
+        return retry_operations
+
+    def _record_failure(self, count, error):
+        self.failed += count
+        self.errors.append(error)
+        logging.error(f"Bulk item rejected: {error}")
+
+    def summary(self):
+        return {
+            "indexed": self.indexed,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "requests": self.requests,
+        }
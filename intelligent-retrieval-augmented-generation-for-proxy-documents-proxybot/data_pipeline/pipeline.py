@@ -1,15 +1,25 @@
 import numpy as np
+import os
 import json
 import time
 import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain_community.document_loaders import TextLoader, DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from opensearchpy import exceptions
 from parameters.logger import get_logger
-from parameters.parameters import aoss_parameters_dict
-from utils.utils import timer
-from logics.aossclient import create_aoss_client
-from awsmanager.bedrock import bedrock_embeddings, bedrock_client, get_text_embedding
+from parameters.parameters import aoss_parameters_dict, answer_cache_dict
+from utils.utils import timer, wait_until, load_section_manifest, record_ingestion
+from vectorstore import create_vector_store_client, commit_vector_store
+from data_pipeline.bulk_indexer import BulkIndexer
+from awsmanager.bedrock import (
+    get_bedrock_embeddings,
+    get_bedrock_client,
+    get_text_embedding,
+    get_embedding_cache,
+)
 
 
 logging = get_logger(__name__)
@@ -20,6 +30,16 @@ CHUNK_SIZE = aoss_parameters_dict["chunk_size"]
 CHUNK_OVERLAP = aoss_parameters_dict["chunk_overlap"]
 VECTOR_SIZE = aoss_parameters_dict["vector_size"]
 SEARCH_SIZE = aoss_parameters_dict["search_size"]
+EMBEDDING_WORKERS = aoss_parameters_dict["embedding_workers"]
+EMBEDDING_RETRIES = aoss_parameters_dict["embedding_retries"]
+INCREMENTAL_INGESTION = aoss_parameters_dict["incremental_ingestion"]
+DELETE_STALE_CHUNKS = aoss_parameters_dict["delete_stale_chunks"]
+INDEXED_HASHES_LIMIT = aoss_parameters_dict["indexed_hashes_limit"]
+READINESS_TIMEOUT = aoss_parameters_dict["readiness_timeout"]
+READINESS_MAX_DELAY = aoss_parameters_dict["readiness_max_delay"]
+
+# boto3 sessions are not thread-safe, clients are created one at a time
+client_creation_lock = threading.Lock()
 
 
 @timer("Documents loading and splitting")
@@ -27,13 +47,24 @@ def documents_loading_splitting(docs_source, ticker, document_date, doc_type="tx
     logging.info("Start of loading documents")
     if doc_type == "txt":
         text_loader_kwargs = {"autodetect_encoding": True}
-        loader = DirectoryLoader(
-            docs_source,
-            glob=f"**/14A_{ticker}_{document_date}_*.txt",
-            loader_cls=TextLoader,
-            loader_kwargs=text_loader_kwargs,
-        )
-        documents = loader.load()
+        manifest = load_section_manifest(docs_source, ticker, document_date)
+        if manifest is not None:
+            # The manifest lists the sections, no need to glob the folder
+            documents = []
+            for section in manifest["sections"]:
+                loader = TextLoader(
+                    os.path.join(docs_source, section["file_name"]),
+                    **text_loader_kwargs,
+                )
+                documents.extend(loader.load())
+        else:
+            loader = DirectoryLoader(
+                docs_source,
+                glob=f"**/14A_{ticker}_{document_date}_*.txt",
+                loader_cls=TextLoader,
+                loader_kwargs=text_loader_kwargs,
+            )
+            documents = loader.load()
     else:
         documents = []
     if documents != []:
@@ -60,6 +91,7 @@ def documents_loading_splitting(docs_source, ticker, document_date, doc_type="tx
         logging.info("Splitting documents, completed")
         logging.info("Inspecting the bedrock documents embedding...")
         try:
+            bedrock_embeddings = get_bedrock_embeddings()
             sample_embedding = np.array(
                 bedrock_embeddings.embed_query(docs[0].page_content)
             )
@@ -90,7 +122,7 @@ def documents_loading_splitting(docs_source, ticker, document_date, doc_type="tx
 
 @timer("Create AOSS indices")
 def create_aoss_indices(aws_session, view_mapping=True):
-    aoss_client, aoss_index = create_aoss_client(aws_session)
+    aoss_client, aoss_index = create_vector_store_client(aws_session)
     index_body = {
         "settings": {"index.knn": True},
         "mappings": {
@@ -98,6 +130,7 @@ def create_aoss_indices(aws_session, view_mapping=True):
                 "page_content": {"type": "text"},
                 "company": {"type": "keyword"},
                 "document_date": {"type": "keyword"},
+                "content_hash": {"type": "keyword"},
                 "metadata": {
                     "properties": {
                         "source": {
@@ -119,44 +152,271 @@ def create_aoss_indices(aws_session, view_mapping=True):
             logging.error(f"Exception error: {error}")
     else:
         logging.info(f"Index {aoss_index} already exists")
+
+    def index_mapping_ready():
+        if not aoss_client.indices.exists(index=aoss_index):
+            return None
+        mapping_json = aoss_client.indices.get_mapping(index=aoss_index)
+        properties = mapping_json[aoss_index]["mappings"].get("properties", {})
+        return mapping_json if "vector_title" in properties else None
+
+    mapping_json = wait_until(
+        index_mapping_ready,
+        f"AOSS index {aoss_index}",
+        timeout=READINESS_TIMEOUT,
+        max_delay=READINESS_MAX_DELAY,
+        # The index answers 404 or drops connections for a while after its creation
+        retry_on=(exceptions.NotFoundError, exceptions.ConnectionError),
+    )
     # view mapping schema for OpenSearch Serverless.
     if view_mapping:
-        mapping_json = aoss_client.indices.get_mapping(aoss_index)
         logging.info(mapping_json)
-    # 30s delay for AOSS collection creation to cool off
-    time.sleep(30)
     return aoss_client
 
 
+def embed_document(document, bedrock_client):
+    input_json = json.dumps({"inputText": document.page_content})
+    return get_text_embedding(input_json, bedrock_client)
+
+
+@timer("Documents embedding")
+def embed_documents(input_docs, bedrock_client, max_workers=EMBEDDING_WORKERS):
+    """
+    Embed documents chunks concurrently using a bounded worker pool.
+    :param input_docs: list of documents chunks
+    :param bedrock_client: bedrock runtime client, shared by all workers
+    :param max_workers: maximum number of concurrent embedding requests
+    :return: list of embeddings in the same order as input_docs (None for a
+    failed chunk) and a dict of failed chunk position to error
+    """
+    embeddings = [None] * len(input_docs)
+    failures = {}
+    if not input_docs:
+        return embeddings, failures
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(embed_document, document, bedrock_client): position
+            for position, document in enumerate(input_docs)
+        }
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                embeddings[position] = future.result()
+            except Exception as error:
+                failures[position] = error
+    elapsed_time = time.time() - start_time
+    embedded = len(input_docs) - len(failures)
+    logging.info(
+        f"Embedded {embedded}/{len(input_docs)} chunks with {max_workers} workers "
+        f"in {elapsed_time:.2f}s ({embedded / max(elapsed_time, 1e-6):.2f} embeddings/sec)"
+    )
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        logging.info(f"Embedding cache: {embedding_cache.stats()}")
+    return embeddings, failures
+
+
+def embed_documents_with_retry(
+    input_docs, bedrock_client, retries=EMBEDDING_RETRIES, max_workers=EMBEDDING_WORKERS
+):
+    """Embed documents chunks, re-submitting only the failed chunks up to `retries` times."""
+    embeddings, failures = embed_documents(input_docs, bedrock_client, max_workers)
+    for attempt in range(1, retries + 1):
+        if not failures:
+            break
+        logging.info(f"Retrying {len(failures)} failed chunks, attempt {attempt}")
+        positions = sorted(failures)
+        retried, retry_failures = embed_documents(
+            [input_docs[position] for position in positions],
+            bedrock_client,
+            max_workers,
+        )
+        failures = {}
+        for retry_position, position in enumerate(positions):
+            if retry_position in retry_failures:
+                failures[position] = retry_failures[retry_position]
+            else:
+                embeddings[position] = retried[retry_position]
+    for position, error in failures.items():
+        logging.error(
+            f"Embedding failed for chunk {position} of "
+            f"{input_docs[position].metadata.get('source')}: {error}"
+        )
+    return embeddings, failures
+
+
+def get_indexed_hashes(aoss_client, aoss_index, ticker, document_date):
+    """
+    Look up the chunks already indexed for a ticker and document date in one query.
+    :return: dict of content_hash to the list of document ids holding it
+    """
+    query = {
+        "size": INDEXED_HASHES_LIMIT,
+        "_source": ["content_hash"],
+        "query": {
+            "bool": {
+                "filter": [
+                    {"term": {"company": ticker}},
+                    {"term": {"document_date": f"{document_date}"}},
+                ]
+            }
+        },
+    }
+    try:
+        response = aoss_client.search(body=query, index=aoss_index)
+    except exceptions.NotFoundError:
+        return {}
+    hits = response["hits"]["hits"]
+    if len(hits) >= INDEXED_HASHES_LIMIT:
+        logging.warning(
+            f"{ticker} {document_date} has at least {INDEXED_HASHES_LIMIT} indexed chunks, "
+            f"chunks beyond this limit will be treated as new"
+        )
+    indexed_hashes = {}
+    for hit in hits:
+        content_hash = hit["_source"].get("content_hash")
+        if content_hash:
+            indexed_hashes.setdefault(content_hash, []).append(hit["_id"])
+    return indexed_hashes
+
+
 # Bulk ingest function
 @timer("Bulk ingestion of data")
-def bulk_ingest_data(session, input_docs, ticker, document_date):
-    aoss_client, aoss_index = create_aoss_client(session)
-    # TODO - Optimise code
-    actions = []
-    bulk_size = 0
-    LIMIT_CHECKER = 250
-    action = {"index": {"_index": aoss_index}}
+def bulk_ingest_data(
+    session,
+    input_docs,
+    ticker,
+    document_date,
+    incremental=INCREMENTAL_INGESTION,
+    delete_stale=DELETE_STALE_CHUNKS,
+    aoss_client=None,
+    aoss_index=None,
+    embedding_client=None,
+):
+    if aoss_client is None:
+        aoss_client, aoss_index = create_vector_store_client(session)
+    if embedding_client is None:
+        embedding_client = get_bedrock_client()
     logging.info(f"Ingesting {ticker}")
-    for document in input_docs:
-        bulk_size += 1
-        input_json = json.dumps({"inputText": document.page_content})
-        text_embeddings = get_text_embedding(input_json, bedrock_client)
-        actions.append(action)
-        json_data = {
-            "company": ticker,
-            "document_date": document_date,
-            "content_hash": hashlib.sha256(document.page_content.encode()).hexdigest(),
-            "page_content": document.page_content,
-            "metadata": document.metadata,
-            "vector_title": text_embeddings,
+    content_hashes = [
+        hashlib.sha256(document.page_content.encode()).hexdigest()
+        for document in input_docs
+    ]
+    stale_ids = []
+    if incremental or delete_stale:
+        indexed_hashes = get_indexed_hashes(
+            aoss_client, aoss_index, ticker, document_date
+        )
+        # A chunk can legitimately occur several times in one filing
+        current_counts = Counter(content_hashes)
+        for content_hash, document_ids in indexed_hashes.items():
+            if incremental:
+                # Copies beyond the current occurrences, none when the chunk is gone
+                stale_ids.extend(document_ids[current_counts[content_hash] :])
+            else:
+                # Every current chunk is indexed again below
+                stale_ids.extend(document_ids)
+    if incremental:
+        # Occurrences of each chunk already indexed, the others are indexed below
+        indexed_counts = {
+            content_hash: len(document_ids)
+            for content_hash, document_ids in indexed_hashes.items()
         }
-        actions.append(json_data)
-        # Only needed if interested in checking limit
-        if bulk_size > LIMIT_CHECKER:
-            aoss_client.bulk(body=actions)
-            logging.info(f"Bulk request sent with size: {bulk_size}")
-            bulk_size = 0
-    logging.info(f"Remaining documents: {bulk_size}")
-    aoss_client.bulk(body=actions)
-    return {"status_code": 200}
+        new_positions = []
+        for position, content_hash in enumerate(content_hashes):
+            if indexed_counts.get(content_hash, 0) > 0:
+                indexed_counts[content_hash] -= 1
+            else:
+                new_positions.append(position)
+        logging.info(
+            f"{len(input_docs) - len(new_positions)} of {len(input_docs)} chunks "
+            f"already indexed for {ticker} {document_date}, skipping them"
+        )
+        input_docs = [input_docs[position] for position in new_positions]
+        content_hashes = [content_hashes[position] for position in new_positions]
+    embeddings, failures = embed_documents_with_retry(input_docs, embedding_client)
+    failed_chunks = []
+    with BulkIndexer(aoss_client, aoss_index) as indexer:
+        for position, document in enumerate(input_docs):
+            content_hash = content_hashes[position]
+            if position in failures:
+                failed_chunks.append(
+                    {
+                        "position": position,
+                        "source": document.metadata.get("source"),
+                        "content_hash": content_hash,
+                        "error": str(failures[position]),
+                    }
+                )
+                continue
+            indexer.index(
+                {
+                    "company": ticker,
+                    "document_date": document_date,
+                    "content_hash": content_hash,
+                    "page_content": document.page_content,
+                    "metadata": document.metadata,
+                    "vector_title": embeddings[position],
+                }
+            )
+        if delete_stale:
+            logging.info(f"Deleting {len(stale_ids)} stale chunks")
+            for document_id in stale_ids:
+                indexer.delete(document_id)
+    commit_vector_store(aoss_client, aoss_index)
+    summary = indexer.summary()
+    logging.info(
+        f"Ingested {ticker} {document_date}: {summary['indexed']} indexed, "
+        f"{summary['deleted']} deleted, {summary['failed']} failed "
+        f"in {summary['requests']} bulk requests"
+    )
+    if summary["indexed"] or summary["deleted"]:
+        record_ingestion(
+            ticker, document_date, answer_cache_dict["ingestion_stamps_path"]
+        )
+    return {"status_code": 200, "failed_chunks": failed_chunks, **summary}
+
+
+def ingest_ticker_year(session, ticker, document_date):
+    """
+    Load, embed and index the text sections of one ticker and year using the
+    process-wide AOSS and Bedrock clients. The chunks are released once indexed.
+    :return: summary of the unit with per stage timings in seconds
+    """
+    start_time = time.time()
+    # Relative source keeps chunk metadata["source"] in the "text_data/<ticker>/<file>"
+    # form that retrieval citations and S3 keys are derived from
+    docs = documents_loading_splitting(
+        docs_source=f"text_data/{ticker}",
+        ticker=ticker,
+        document_date=document_date,
+    )
+    load_time = time.time()
+    summary = {"ticker": ticker, "document_date": document_date, "chunks": len(docs)}
+    if docs:
+        with client_creation_lock:
+            aoss_client, aoss_index = create_vector_store_client(session)
+        embedding_client = get_bedrock_client()
+        result = bulk_ingest_data(
+            session,
+            input_docs=docs,
+            ticker=ticker,
+            document_date=document_date,
+            aoss_client=aoss_client,
+            aoss_index=aoss_index,
+            embedding_client=embedding_client,
+        )
+        summary.update(
+            {
+                "indexed": result["indexed"],
+                "deleted": result["deleted"],
+                "failed": result["failed"] + len(result["failed_chunks"]),
+            }
+        )
+    del docs
+    end_time = time.time()
+    summary["load_seconds"] = round(load_time - start_time, 2)
+    summary["ingest_seconds"] = round(end_time - load_time, 2)
+    summary["total_seconds"] = round(end_time - start_time, 2)
+    return summary
@@ -1,77 +1,117 @@
 import numpy as np
 import os
+import re
 import json
+import time
+import datetime
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from parameters.logger import get_logger
-from parameters.parameters import PROXY_TEXT_BUCKET, aoss_parameters_dict, main_path
-from utils.utils import get_raw_data
-from awsmanager.s3_manager import FileReader
-from awsmanager.manager import AWSClientSession, AWSSecretsManager
-from awsmanager.bedrock import get_text_embedding, bedrock_client
-from parameters.parameters import AWS_DEFAULT_REGION, config
-from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
+from parameters.parameters import (
+    PROXY_TEXT_BUCKET,
+    aoss_parameters_dict,
+    main_path,
+    source_cache_dict,
+    log_files_dict,
+)
+from data_pipeline.source_cache import SourceFileCache
+from utils.utils import estimate_tokens, truncate_to_tokens
+from awsmanager.manager import AWSClientSession
+from vectorstore import create_vector_store_client
+from awsmanager.bedrock import get_text_embedding, get_bedrock_client, EMBEDDING_MODEL_ID
+from awsmanager.registry import registry
 
 logging = get_logger(__name__)
 
+source_fetch_timing_log = log_files_dict["source_fetch_timing_log"]
+source_fetch_timing_lock = threading.Lock()
+
 BULK_LIMIT = aoss_parameters_dict["bulk_limit"]
 CHUNK_SIZE = aoss_parameters_dict["chunk_size"]
 CHUNK_OVERLAP = aoss_parameters_dict["chunk_overlap"]
 VECTOR_SIZE = aoss_parameters_dict["vector_size"]
 SEARCH_SIZE = aoss_parameters_dict["search_size"]
+QUERY_EMBEDDING_CACHE_SIZE = aoss_parameters_dict["query_embedding_cache_size"]
+RETRIEVAL_MODE = aoss_parameters_dict["retrieval_mode"]
+RRF_K = aoss_parameters_dict["rrf_k"]
+HYBRID_CANDIDATES = aoss_parameters_dict["hybrid_candidates"]
+RERANK = aoss_parameters_dict["rerank"]
+RERANK_CANDIDATES = aoss_parameters_dict["rerank_candidates"]
+MMR_LAMBDA = aoss_parameters_dict["mmr_lambda"]
+LEXICAL_WEIGHT = aoss_parameters_dict["lexical_weight"]
+CONTEXT_MODE = aoss_parameters_dict["context_mode"]
+CONTEXT_TOKEN_BUDGET = aoss_parameters_dict["context_token_budget"]
+CONTEXT_NEIGHBOUR_CHUNKS = aoss_parameters_dict["context_neighbour_chunks"]
+
+
+def create_source_cache():
+    return SourceFileCache(
+        AWSClientSession().get_s3_client(),
+        PROXY_TEXT_BUCKET,
+        source_cache_dict["disk_path"],
+        max_memory_bytes=source_cache_dict["memory_mb"] * 1024 * 1024,
+        validation_seconds=source_cache_dict["validation_seconds"],
+    )
+
 
-# AOSS Settings
-aws_session = AWSClientSession()
-ASM = AWSSecretsManager(aws_session)
-aoss_secrets = ASM.get_secret_credentials(config["secret"]["aoss_credentials_name"])
-aoss_host = aoss_secrets["aoss_host"]
-aoss_port = aoss_secrets["aoss_port"]
-aoss_index = aoss_secrets["aoss_index"]
-aoss_region = AWS_DEFAULT_REGION
-service = "aoss"
-credentials = aws_session.obtain_credentials()
-
-aoss_auth = AWSV4SignerAuth(credentials, aoss_region, service)
-aoss_client = OpenSearch(
-    hosts=[{"host": aoss_host, "port": aoss_port}],
-    http_auth=aoss_auth,
-    use_ssl=True,
-    verify_certs=True,
-    connection_class=RequestsHttpConnection,
-    pool_maxsize=20,
-    timeout=50000,
+registry.register(
+    "vector_store", lambda: create_vector_store_client(AWSClientSession())
 )
+registry.register("source_cache", create_source_cache)
+
+
+def get_vector_store():
+    """Return the shared vector store client and index name, created on first use."""
+    return registry.get("vector_store")
+
+
+def get_source_cache():
+    return registry.get("source_cache")
+
+
+# Runs the BM25 and kNN queries of a hybrid retrieval side by side
+search_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def fetch_source(source, ticker, local_run):
+    """Fetch the text of one retrieved source file and record how long it took."""
+    start_time = time.time()
+    if local_run:
+        file_path = os.path.join(main_path, source)
+        logging.info(f"File path: {file_path} processed")
+        text, tier = get_source_cache().fetch_local(file_path)
+    else:
+        file_name = os.path.basename(source)
+        s3_file_path = f"{ticker}/{file_name}"
+        logging.info(f"S3 File path: {s3_file_path} processed")
+        text, tier = get_source_cache().fetch(s3_file_path)
+    seconds = time.time() - start_time
+    logging.info(f"Fetched {source} from {tier} in {seconds:.3f}s")
+    with source_fetch_timing_lock:
+        with open(source_fetch_timing_log, "a") as log_file:
+            log_file.write(
+                f"{datetime.datetime.now()},{ticker},{tier},{seconds:.4f},\"{source}\"\n"
+            )
+    return text
 
 
 def create_context(sources, ticker, _date, local_run):
     logging.info(f"Sources: {sources}")
     logging.info(f"Ticker: {ticker}")
-    data_list = []
     _date = str(_date)
+    main_text_length = len(f"14A_{ticker}_{_date}_XXX")
 
-    for source in sources:
-        file_path = os.path.join(main_path, source)
-        logging.info(f"File path: {file_path} processed")
-        main_text_length = len(f"14A_{ticker}_{_date}_XXX")
-        logging.info(f"Starting -> file path: {file_path}...")
-
-        if local_run:
-            print(source)
-            file_path = os.path.join(main_path, source)
-            print(file_path)
-            logging.info(f"File path: {file_path} processed")
-            data_list.append((get_raw_data(file_path), source[:main_text_length]))
-        else:
-            file_name = os.path.basename(source)
-            s3_file_path = f"{ticker}/{file_name}"
-            logging.info(f"S3 File path: {s3_file_path} processed")
-            loader = FileReader(aws_session, PROXY_TEXT_BUCKET)
-            logging.info(s3_file_path)
-            data_list.append(
-                (
-                    loader.read_file(s3_file_path, file_format="txt").decode(),
-                    source[:main_text_length],
-                )
-            )
-        logging.info(f"<DATA LIST> >> {data_list}")
+    # map keeps the rank order of the sources
+    with ThreadPoolExecutor(max_workers=source_cache_dict["fetch_workers"]) as executor:
+        texts = list(
+            executor.map(lambda source: fetch_source(source, ticker, local_run), sources)
+        )
+    data_list = [
+        (text, source[:main_text_length]) for text, source in zip(texts, sources)
+    ]
+    logging.info(f"<DATA LIST> >> {data_list}")
+    logging.info(f"Source file cache: {get_source_cache().stats()}")
 
     output_text = [
         f"<INFOTEXT FILE: {file}>\n{data}\n\n</INFOTEXT>" for data, file in data_list
@@ -79,12 +119,108 @@ def create_context(sources, ticker, _date, local_run):
     return "\n".join(output_text)
 
 
-def get_index_response(
-    user_input, document_date, ticker, local_run, search_size=SEARCH_SIZE
+def hit_source(hit):
+    return str(hit["_source"]["metadata"]["source"].split("\\")[-1])
+
+
+def create_chunk_context(
+    hits,
+    ticker,
+    _date,
+    local_run,
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    neighbour_chunks=CONTEXT_NEIGHBOUR_CHUNKS,
 ):
-    user_input_json = json.dumps({"inputText": user_input})
-    logging.info(f"User input: {user_input}")
-    input_text_embeddings = get_text_embedding(user_input_json, bedrock_client)
+    """
+    Build the context from the retrieved chunks instead of their whole source files.
+    Each chunk is widened by neighbour_chunks chunks of its source text on both sides,
+    overlapping passages of a source are merged, and passages are packed in rank order
+    until token_budget is reached. The best passage is truncated if it alone is over budget.
+    """
+    _date = str(_date)
+    main_text_length = len(f"14A_{ticker}_{_date}_XXX")
+    source_texts = {}
+    if neighbour_chunks:
+        sources = list(dict.fromkeys(hit_source(hit) for hit in hits))
+        with ThreadPoolExecutor(
+            max_workers=source_cache_dict["fetch_workers"]
+        ) as executor:
+            texts = executor.map(
+                lambda source: fetch_source(source, ticker, local_run), sources
+            )
+            source_texts = dict(zip(sources, texts))
+    window = neighbour_chunks * (CHUNK_SIZE - CHUNK_OVERLAP)
+
+    passages = []
+    for hit in hits:
+        source = hit_source(hit)
+        chunk = hit["_source"]["page_content"]
+        source_text = source_texts.get(source, "")
+        position = source_text.find(chunk) if source_text else -1
+        if position < 0:
+            passages.append({"source": source, "span": None, "text": chunk})
+            continue
+        start = max(0, position - window)
+        end = min(len(source_text), position + len(chunk) + window)
+        for passage in passages:
+            span = passage["span"]
+            if passage["source"] == source and span and start <= span[1] and end >= span[0]:
+                passage["span"] = (min(start, span[0]), max(end, span[1]))
+                passage["text"] = source_text[passage["span"][0] : passage["span"][1]]
+                break
+        else:
+            passages.append(
+                {"source": source, "span": (start, end), "text": source_text[start:end]}
+            )
+
+    output_text = []
+    used_tokens = 0
+    for passage in passages:
+        text = passage["text"]
+        tokens = estimate_tokens(text)
+        if used_tokens + tokens > token_budget:
+            if output_text:
+                continue
+            text = truncate_to_tokens(text, token_budget)
+            tokens = estimate_tokens(text)
+        used_tokens += tokens
+        output_text.append(
+            f"<INFOTEXT FILE: {passage['source'][:main_text_length]}>\n{text}\n\n</INFOTEXT>"
+        )
+    logging.info(
+        f"Packed {len(output_text)}/{len(passages)} passages from {len(hits)} chunks "
+        f"into {used_tokens}/{token_budget} estimated tokens"
+    )
+    return "\n".join(output_text)
+
+
+def normalise_question(question):
+    return " ".join(question.split())
+
+
+@functools.lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _cached_query_embedding(normalised_question, model_id):
+    question_json = json.dumps({"inputText": normalised_question})
+    # Misses still go through the persistent embedding cache before Bedrock
+    return tuple(get_text_embedding(question_json, get_bedrock_client(), model_id))
+
+
+def get_query_embedding(question, model_id=EMBEDDING_MODEL_ID):
+    """Embed a question, memoised in-process by normalised text and model id."""
+    embedding = _cached_query_embedding(normalise_question(question), model_id)
+    logging.info(f"Query embedding cache: {_cached_query_embedding.cache_info()}")
+    return list(embedding)
+
+
+def search_filters(ticker, document_date):
+    return [
+        {"term": {"company": ticker}},
+        {"term": {"document_date": f"{document_date}"}},
+    ]
+
+
+def knn_search(user_input, document_date, ticker, search_size):
+    input_text_embeddings = get_query_embedding(user_input)
     query = {
         "size": search_size,
         "_source": True,
@@ -98,19 +234,157 @@ def get_index_response(
                         }
                     }
                 },
-                "filter": [
-                    {"term": {"company": ticker}},
-                    {"term": {"document_date": f"{document_date}"}},
-                ],
+                "filter": search_filters(ticker, document_date),
+            }
+        },
+    }
+    aoss_client, aoss_index = get_vector_store()
+    return aoss_client.search(body=query, index=aoss_index)
+
+
+def lexical_search(user_input, document_date, ticker, search_size):
+    query = {
+        "size": search_size,
+        # The re-ranking needs the vectors of every candidate
+        "_source": True if RERANK else {"excludes": ["vector_title"]},
+        "query": {
+            "bool": {
+                "must": {"match": {"page_content": user_input}},
+                "filter": search_filters(ticker, document_date),
             }
         },
     }
+    aoss_client, aoss_index = get_vector_store()
+    return aoss_client.search(body=query, index=aoss_index)
+
+
+def reciprocal_rank_fusion(responses, search_size, rrf_k=RRF_K):
+    """
+    Fuse ranked AOSS responses into one response of search_size hits.
+    Hits are scored by the sum of 1 / (rrf_k + rank) over the responses they appear in,
+    the hit with the most fields (e.g. the kNN one with its vector) is kept.
+    """
+    fused_hits = {}
+    for response in responses:
+        for rank, hit in enumerate(response["hits"]["hits"], start=1):
+            fused = fused_hits.setdefault(hit["_id"], {"hit": hit, "score": 0.0})
+            fused["score"] += 1.0 / (rrf_k + rank)
+            if len(hit["_source"]) > len(fused["hit"]["_source"]):
+                fused["hit"] = hit
+    ranked = sorted(fused_hits.values(), key=lambda fused: fused["score"], reverse=True)
+    hits = [
+        {**fused["hit"], "_score": fused["score"]} for fused in ranked[:search_size]
+    ]
+    return {"hits": {"total": {"value": len(fused_hits)}, "hits": hits}}
+
+
+def question_terms(text):
+    return set(re.findall(r"[a-z0-9]{3,}", text.lower()))
+
+
+def rerank_hits(
+    user_input,
+    hits,
+    search_size,
+    mmr_lambda=MMR_LAMBDA,
+    lexical_weight=LEXICAL_WEIGHT,
+):
+    """
+    Select a diverse top search_size from the candidate hits with maximal marginal relevance.
+    Relevance mixes the cosine similarity to the question with the share of question
+    terms found in the chunk, redundancy is the highest cosine similarity to the hits
+    already selected. Hits without a stored vector keep their retrieval order.
+    """
+    if len(hits) <= search_size or any(
+        "vector_title" not in hit["_source"] for hit in hits
+    ):
+        return hits[:search_size]
+    vectors = np.array([hit["_source"]["vector_title"] for hit in hits], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.array(get_query_embedding(user_input), dtype=np.float32)
+    query /= max(np.linalg.norm(query), 1e-12)
+    terms = sorted(question_terms(user_input))
+    if terms:
+        chunk_terms = [question_terms(hit["_source"]["page_content"]) for hit in hits]
+        lexical = np.array(
+            [[term in chunk for term in terms] for chunk in chunk_terms], dtype=np.float32
+        ).mean(axis=1)
+    else:
+        lexical = np.zeros(len(hits), dtype=np.float32)
+    relevance = (1 - lexical_weight) * (vectors @ query) + lexical_weight * lexical
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < search_size:
+        mmr = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        mmr[selected] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [{**hits[index], "_score": float(relevance[index])} for index in selected]
+
+
+def search_chunks(user_input, document_date, ticker, search_size=SEARCH_SIZE):
+    """Return the AOSS response of the chunks retrieved with RETRIEVAL_MODE."""
+    if RERANK:
+        candidates_response = retrieve_candidates(
+            user_input, document_date, ticker, max(search_size, RERANK_CANDIDATES)
+        )
+        start_time = time.time()
+        candidate_hits = candidates_response["hits"]["hits"]
+        hits = rerank_hits(user_input, candidate_hits, search_size)
+        rerank_seconds = round(time.time() - start_time, 4)
+        logging.info(
+            f"Re-ranked {len(candidate_hits)} candidates into {len(hits)} hits "
+            f"in {rerank_seconds}s"
+        )
+        return {
+            **candidates_response,
+            "hits": {**candidates_response["hits"], "hits": hits},
+            "rerank_seconds": rerank_seconds,
+        }
+    return retrieve_candidates(user_input, document_date, ticker, search_size)
+
+
+def retrieve_candidates(user_input, document_date, ticker, search_size):
+    if RETRIEVAL_MODE != "hybrid":
+        return knn_search(user_input, document_date, ticker, search_size)
+    start_time = time.time()
+    candidates = max(search_size, HYBRID_CANDIDATES)
+    knn_future = search_executor.submit(
+        knn_search, user_input, document_date, ticker, candidates
+    )
+    lexical_future = search_executor.submit(
+        lexical_search, user_input, document_date, ticker, candidates
+    )
+    knn_response, lexical_response = knn_future.result(), lexical_future.result()
+    fused_response = reciprocal_rank_fusion(
+        [knn_response, lexical_response], search_size
+    )
+    knn_ids = {hit["_id"] for hit in knn_response["hits"]["hits"]}
+    lexical_ids = {hit["_id"] for hit in lexical_response["hits"]["hits"]}
+    fused_ids = [hit["_id"] for hit in fused_response["hits"]["hits"]]
+    logging.info(
+        f"Hybrid retrieval in {time.time() - start_time:.3f}s: "
+        f"{sum(hit_id in knn_ids for hit_id in fused_ids)} kNN and "
+        f"{sum(hit_id in lexical_ids for hit_id in fused_ids)} BM25 hits "
+        f"in the fused top {len(fused_ids)}"
+    )
+    return fused_response
+
+
+def get_index_response(
+    user_input, document_date, ticker, local_run, search_size=SEARCH_SIZE
+):
+    logging.info(f"User input: {user_input}")
     # AOSS Client Search
-    relevant_aoss_response = aoss_client.search(body=query, index=aoss_index)
+    relevant_aoss_response = search_chunks(
+        user_input, document_date, ticker, search_size
+    )
     try:
         metadata_source_list = [
-            str(hit["_source"]["metadata"]["source"].split("\\")[-1])
-            for hit in relevant_aoss_response["hits"]["hits"]
+            hit_source(hit) for hit in relevant_aoss_response["hits"]["hits"]
         ]
         logging.info(f"Metadata source list: {metadata_source_list}")
         unique_source_list = []
@@ -119,12 +393,20 @@ def get_index_response(
             for item in metadata_source_list
             if item not in unique_source_list
         ]
-        context_text = create_context(
-            sources=unique_source_list,
-            ticker=ticker,
-            _date=document_date,
-            local_run=local_run,
-        )
+        if CONTEXT_MODE == "chunk":
+            context_text = create_chunk_context(
+                relevant_aoss_response["hits"]["hits"],
+                ticker=ticker,
+                _date=document_date,
+                local_run=local_run,
+            )
+        else:
+            context_text = create_context(
+                sources=unique_source_list,
+                ticker=ticker,
+                _date=document_date,
+                local_run=local_run,
+            )
     except Exception as error:
         logging.error(f"Exception error: {error}")
         context_text = "Sorry, I am not able to process your request at the moment. Please try again later."
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+from parameters.logger import get_logger
+
+
+logging = get_logger(__name__)
+
+
+class SourceFileCache:
+    def __init__(
+        self,
+        s3_client,
+        bucket_name,
+        disk_path,
+        max_memory_bytes=64 * 1024 * 1024,
+        validation_seconds=300,
+    ):
+        """
+        Tiered cache of the retrieved source text files.
+        Lookups go through an in-process LRU bounded by bytes, then a local disk tier
+        and finally the S3 bucket as origin. Cached entries are revalidated against
+        the object ETag with a conditional GET once validation_seconds have passed.
+        :param s3_client: S3 client shared by all lookups
+        :param bucket_name: origin bucket of the source files
+        :param disk_path: folder of the disk tier
+        :param max_memory_bytes: size limit of the in-process tier
+        :param validation_seconds: time a cached entry is served without revalidation
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.disk_path = disk_path
+        self.max_memory_bytes = max_memory_bytes
+        self.validation_seconds = validation_seconds
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "revalidated": 0,
+            "origin_fetches": 0,
+        }
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _memory_get(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key, text, version, validated_at):
+        size = len(text.encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+        with self.lock:
+            previous = self.memory.pop(key, None)
+            if previous is not None:
+                self.memory_bytes -= previous["size"]
+            self.memory[key] = {
+                "text": text,
+                "version": version,
+                "validated_at": validated_at,
+                "size": size,
+            }
+            self.memory_bytes += size
+            while self.memory_bytes > self.max_memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= evicted["size"]
+
+    def _disk_paths(self, key):
+        data_path = os.path.join(self.disk_path, self.bucket_name, *key.split("/"))
+        return data_path, f"{data_path}.meta.json"
+
+    def _disk_get(self, key):
+        data_path, meta_path = self._disk_paths(key)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r") as file:
+            meta = json.load(file)
+        with open(data_path, "r", encoding="utf-8") as file:
+            text = file.read()
+        return {"text": text, **meta}
+
+    def _disk_put(self, key, text, version, validated_at):
+        data_path, meta_path = self._disk_paths(key)
+        # Several fetch threads may create the same ticker folder at once
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        temp_path = f"{data_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temp_path, data_path)
+        with open(meta_path, "w") as file:
+            json.dump({"version": version, "validated_at": validated_at}, file)
+
+    def get_text(self, key):
+        """Return the text of the S3 object `key`, served from the fastest valid tier."""
+        return self.fetch(key)[0]
+
+    def get_local_text(self, file_path):
+        """Return the text of a local file, re-read only when its size or mtime changed."""
+        return self.fetch_local(file_path)[0]
+
+    def fetch(self, key):
+        """Return the text of the S3 object `key` and the name of the tier that served it."""
+        now = time.time()
+        entry = self._memory_get(key)
+        tier = "memory_hits"
+        if entry is None:
+            entry = self._disk_get(key)
+            tier = "disk_hits"
+        if entry is not None and now - entry["validated_at"] < self.validation_seconds:
+            self._count(tier)
+            if tier == "disk_hits":
+                self._memory_put(key, entry["text"], entry["version"], entry["validated_at"])
+            return entry["text"], tier
+
+        request = {"Bucket": self.bucket_name, "Key": key}
+        if entry is not None:
+            request["IfNoneMatch"] = entry["version"]
+        try:
+            response = self.s3_client.get_object(**request)
+        except ClientError as error:
+            if entry is not None and error.response["Error"]["Code"] in (
+                "304",
+                "NotModified",
+            ):
+                self._count("revalidated")
+                self._memory_put(key, entry["text"], entry["version"], now)
+                self._disk_put(key, entry["text"], entry["version"], now)
+                return entry["text"], "revalidated"
+            raise
+        self._count("origin_fetches")
+        text = response["Body"].read().decode()
+        version = response["ETag"]
+        self._memory_put(key, text, version, now)
+        self._disk_put(key, text, version, now)
+        return text, "origin_fetches"
+
+    def fetch_local(self, file_path):
+        """Return the text of a local file and the name of the tier that served it."""
+        file_stat = os.stat(file_path)
+        version = f"{file_stat.st_mtime_ns}-{file_stat.st_size}"
+        entry = self._memory_get(file_path)
+        if entry is not None and entry["version"] == version:
+            self._count("memory_hits")
+            return entry["text"], "memory_hits"
+        with open(file_path, "r") as file:
+            text = file.read()
+        self._count("origin_fetches")
+        self._memory_put(file_path, text, version, time.time())
+        return text, "origin_fetches"
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            memory_bytes = self.memory_bytes
+        lookups = sum(counters.values())
+        cached = counters["memory_hits"] + counters["disk_hits"] + counters["revalidated"]
+        return {
+            **counters,
+            "hit_rate": round(cached / lookups, 3) if lookups else 0.0,
+            "memory_bytes": memory_bytes,
+        }
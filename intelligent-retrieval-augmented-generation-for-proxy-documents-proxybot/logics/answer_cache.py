@@ -0,0 +1,140 @@
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from parameters.logger import get_logger
+from parameters.parameters import answer_cache_dict
+from utils.utils import load_ingestion_stamps
+
+
+logging = get_logger(__name__)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        ingestion_stamps_path,
+        similarity_threshold=0.97,
+        ttl_seconds=3600,
+        max_entries=1000,
+    ):
+        """
+        Cache of generated answers shared by all chat sessions of the process.
+        Answers are stored with the embedding of their disambiguated question per
+        (ticker, document_date, model_id) and returned for a new question whose
+        cosine similarity reaches similarity_threshold. Entries expire after
+        ttl_seconds and are dropped once their ticker and date is re-ingested.
+        :param ingestion_stamps_path: file of the last ingestion time per ticker/date
+        :param similarity_threshold: minimum cosine similarity to serve a cached answer
+        :param ttl_seconds: lifetime of an entry in seconds
+        :param max_entries: maximum number of entries, the oldest are evicted first
+        """
+        self.ingestion_stamps_path = ingestion_stamps_path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(ticker, document_date, model_id):
+        return (ticker, str(document_date), model_id)
+
+    @staticmethod
+    def _normalise(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop_invalid(self, now):
+        """Drop expired entries and entries older than the last ingestion of their ticker/date."""
+        ingestion_stamps = load_ingestion_stamps(self.ingestion_stamps_path)
+        for entry_id, entry in list(self.entries.items()):
+            ticker, document_date, _ = entry["key"]
+            ingested_at = ingestion_stamps.get(f"{ticker}_{document_date}", 0)
+            if (
+                now - entry["created_at"] > self.ttl_seconds
+                or entry["created_at"] < ingested_at
+            ):
+                del self.entries[entry_id]
+
+    def lookup(self, ticker, document_date, model_id, embedding):
+        """Return the cached answer closest to the question embedding, or None."""
+        key = self._key(ticker, document_date, model_id)
+        query = self._normalise(embedding)
+        with self.lock:
+            self._drop_invalid(time.time())
+            candidates = [
+                entry for entry in self.entries.values() if entry["key"] == key
+            ]
+            if candidates:
+                similarities = np.stack(
+                    [entry["embedding"] for entry in candidates]
+                ) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self.hits += 1
+                    logging.info(
+                        f"Answer cache hit for {key} with similarity "
+                        f"{similarities[best]:.4f}: {candidates[best]['question']}"
+                    )
+                    return candidates[best]
+            self.misses += 1
+        return None
+
+    def store(
+        self, ticker, document_date, model_id, question, embedding, answer, source, index_response
+    ):
+        with self.lock:
+            self.entries[self.next_id] = {
+                "key": self._key(ticker, document_date, model_id),
+                "question": question,
+                "embedding": self._normalise(embedding),
+                "answer": answer,
+                "source": source,
+                "index_response": index_response,
+                "created_at": time.time(),
+            }
+            self.next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, ticker, document_date=None):
+        with self.lock:
+            for entry_id, entry in list(self.entries.items()):
+                if entry["key"][0] == ticker and (
+                    document_date is None or entry["key"][1] == str(document_date)
+                ):
+                    del self.entries[entry_id]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self.entries),
+            }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    global _answer_cache
+    if not answer_cache_dict["enabled"]:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                ingestion_stamps_path=answer_cache_dict["ingestion_stamps_path"],
+                similarity_threshold=answer_cache_dict["similarity_threshold"],
+                ttl_seconds=answer_cache_dict["ttl_seconds"],
+                max_entries=answer_cache_dict["max_entries"],
+            )
+    return _answer_cache
@@ -1,12 +1,21 @@
 import datetime
+import functools
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from parameters.logger import get_logger
-from data_pipeline.search import get_index_response
-from awsmanager.bedrock import bedrock_client
+from data_pipeline.search import get_index_response, get_query_embedding
+from awsmanager.bedrock import get_bedrock_client
+from awsmanager.manager import bedrock_call_stats
 from logics.aossqueries import BedrockQueries
+from logics.answer_cache import get_answer_cache
+from logics.router import QuestionRouter
+from logics.memory import ConversationMemory
 from parameters.parameters import (
     log_files_dict,
     ticker_dict,
     aoss_parameters_dict,
+    chatbot_parameters_dict,
     local_run,
 )
 
@@ -18,63 +27,269 @@ conversation_log = log_files_dict["conversation_log"]
 disambiguated_log = log_files_dict["disambiguated_log"]
 answer_timing_log = log_files_dict["answer_timing_log"]
 
+# Shared by all chat sessions, retrievals on the raw question run here during disambiguation
+speculation_executor = ThreadPoolExecutor(
+    max_workers=chatbot_parameters_dict["speculation_workers"]
+)
+# "cancelled" speculations never ran, "discarded" ones ran for an answer cache hit
+speculation_stats = {"hit": 0, "miss": 0, "cancelled": 0, "discarded": 0}
+speculation_stats_lock = threading.Lock()
+
+
+def record_speculation(outcome):
+    with speculation_stats_lock:
+        speculation_stats[outcome] += 1
+        attempts = sum(speculation_stats.values())
+        logging.info(
+            f"Speculative retrieval {outcome}, {speculation_stats['hit']}/{attempts} "
+            f"speculations reused"
+        )
+
+
+def cosine_similarity(first_vector, second_vector):
+    first_vector = np.asarray(first_vector, dtype=np.float32)
+    second_vector = np.asarray(second_vector, dtype=np.float32)
+    norm = np.linalg.norm(first_vector) * np.linalg.norm(second_vector)
+    return float(first_vector @ second_vector / norm) if norm else 0.0
+
 
 class RagBot:
     def __init__(self):
-        self.conversation_history = []
+        self.model_id = None
+        self.memory = ConversationMemory(
+            summarize=self.summarize_turns,
+            token_budget=chatbot_parameters_dict["memory_token_budget"],
+            recent_turns=chatbot_parameters_dict["memory_recent_turns"],
+            summary_token_budget=chatbot_parameters_dict["memory_summary_tokens"],
+        )
         self.separator_chatbot = f"{'-'*40} PROXY BOT:"
         self.separator_user = f"{'-'*40} USER:"
+        self.router = QuestionRouter(
+            get_bedrock_client(), chatbot_parameters_dict["router_model_id"]
+        )
 
-    def query(self, user_input, date, company, model_id):
-        start_time = datetime.datetime.now()
-        bedrock_queries = BedrockQueries(bedrock_client, model_id)
-        disambiguated_question = bedrock_queries.disambiguate(
-            user_input, self.conversation_history, company
+    @property
+    def conversation_history(self):
+        return self.memory.as_list()
+
+    def summarize_turns(self, summary, turns_text, max_tokens):
+        model_id = chatbot_parameters_dict["memory_summary_model_id"] or self.model_id
+        return BedrockQueries(get_bedrock_client(), model_id).summarize_conversation(
+            summary, turns_text, max_tokens
         )
+
+    def query(self, user_input, date, company, model_id, stream=False):
+        """
+        Answer a question about the proxy vote of company for the given date.
+        :param stream: when True, "answer" is a generator yielding the answer text as it is
+            generated. The turn is logged and added to the history once it is consumed.
+        :return: dict with the answer, its sources and the raw index response
+        """
+        start_time = datetime.datetime.now()
+        self.model_id = model_id
+        ticker = ticker_dict[company]
+        conversation_history = self.conversation_history
+        bedrock_queries = BedrockQueries(get_bedrock_client(), model_id)
+        speculative_retrieval = None
+        if chatbot_parameters_dict["fast_path_routing"] and not self.router.route(
+            user_input, conversation_history, company, ticker
+        ):
+            disambiguated_question = user_input
+        else:
+            if chatbot_parameters_dict["speculative_retrieval"]:
+                speculative_retrieval = speculation_executor.submit(
+                    get_index_response,
+                    user_input,
+                    date,
+                    ticker=ticker,
+                    local_run=local_run,
+                    search_size=aoss_parameters_dict["search_size"],
+                )
+            disambiguated_question = bedrock_queries.disambiguate(
+                user_input, conversation_history, company
+            )
         disambiguate_time = datetime.datetime.now()
-        context, source, index_response = get_index_response(
-            disambiguated_question,
-            date,
-            ticker=ticker_dict[company],
-            local_run=local_run,
-            search_size=aoss_parameters_dict["search_size"],
-        )
-        logging.info(f"CONTEXT: {context}")
-        answer_data = context
-        retreive_time = datetime.datetime.now()
         with open(chatbot_log, "w") as log_file:
             log_file.write(f"{self.separator_user}{user_input}")
-        with open(conversation_log, "w") as conversation_log_file:
-            if answer_data:
-                response = bedrock_queries.get_conversation_response(
-                    disambiguated_question, answer_data, self.conversation_history
+        answer_cache = get_answer_cache()
+        cached_answer = None
+        if answer_cache is not None:
+            # The embedding is memoised, so a cache miss does not pay for it twice
+            question_embedding = get_query_embedding(disambiguated_question)
+            cached_answer = answer_cache.lookup(
+                ticker, date, model_id, question_embedding
+            )
+        if cached_answer is not None:
+            if speculative_retrieval is not None:
+                # cancel() only succeeds while the retrieval is still queued
+                if speculative_retrieval.cancel():
+                    record_speculation("cancelled")
+                else:
+                    record_speculation("discarded")
+            answer_chunks = [cached_answer["answer"]]
+            source = cached_answer["source"]
+            index_response = cached_answer["index_response"]
+            cache_store = None
+            speculation = "cached"
+            retreive_time = datetime.datetime.now()
+        else:
+            (context, source, index_response), speculation = self.retrieve(
+                user_input,
+                disambiguated_question,
+                date,
+                ticker,
+                speculative_retrieval,
+                first_turn=not conversation_history,
+            )
+            logging.info(f"CONTEXT: {context}")
+            answer_data = context
+            retreive_time = datetime.datetime.now()
+            if not answer_data:
+                response = "No information found on query in provided documents."
+                return {
+                    "answer": iter([response]) if stream else response,
+                    "source": ["No source info."],
+                    "index_response": "No index response.",
+                }
+            if stream:
+                answer_chunks = bedrock_queries.stream_conversation_response(
+                    disambiguated_question, answer_data, conversation_history
                 )
-                question_answer_internal = f"{self.separator_user}{user_input}\n(WHICH I UNDERSTAND TO MEAN: {disambiguated_question})\n{self.separator_chatbot}{response}"
-                question_answer_external = f"{self.separator_user}{user_input}\n{self.separator_chatbot}{response}"
-                self.conversation_history.append(question_answer_external)
-                conversation_log_file.write(question_answer_internal)
-                answer_time = datetime.datetime.now()
-                seconds_to_disambiguate = (disambiguate_time - start_time).seconds
-                seconds_to_retreive = (retreive_time - disambiguate_time).seconds
-                seconds_to_summarize = (answer_time - retreive_time).seconds
-                seconds_total = (answer_time - start_time).seconds
-                timing = f"\TOTAL TIME: {seconds_total} SECONDS; DISAMBIGUATION TOOK {seconds_to_disambiguate} SECONDS; RETREIVAL TOOK {seconds_to_retreive} SECONDS; SUMMARIZATION TOOK {seconds_to_summarize} SECONDS"
-                print(timing)
-                conversation_log_file.write(timing)
-                with open(answer_timing_log, "a") as log_file:
-                    log_file.write(
-                        f'{datetime.datetime.now()},{seconds_total},{seconds_to_disambiguate},{seconds_to_retreive},{seconds_to_summarize},"{user_input}"","{disambiguated_question}"'
-                    )
             else:
-                response = "No information found on query in provided documents."
-                source = ["No source info."]
-                index_response = "No index response."
+                answer_chunks = [
+                    bedrock_queries.get_conversation_response(
+                        disambiguated_question, answer_data, conversation_history
+                    )
+                ]
+            cache_store = None
+            # A failed retrieval still returns a context, the error message, and no sources
+            retrieval_succeeded = bool(source) and bool(
+                (index_response or {}).get("hits", {}).get("hits")
+            )
+            if answer_cache is not None and retrieval_succeeded:
+                cache_store = functools.partial(
+                    answer_cache.store,
+                    ticker,
+                    date,
+                    model_id,
+                    disambiguated_question,
+                    question_embedding,
+                )
+        answer = self.answer_generator(
+            answer_chunks,
+            user_input,
+            disambiguated_question,
+            [start_time, disambiguate_time, retreive_time],
+            source,
+            index_response,
+            cache_store=cache_store,
+            cached_question=cached_answer["question"] if cached_answer else None,
+            speculation=speculation,
+        )
         answer_payload = {
-            "answer": response,
+            "answer": answer if stream else "".join(answer),
             "source": source,
             "index_response": index_response,
         }
         return answer_payload
 
+    def retrieve(
+        self,
+        user_input,
+        disambiguated_question,
+        date,
+        ticker,
+        speculative_retrieval,
+        first_turn=False,
+    ):
+        """
+        Return the index response of the disambiguated question and whether the
+        speculative retrieval on the raw question was reused ("hit"), discarded
+        ("miss") or not started ("off"). The speculative results are reused on the
+        first turn or when both questions are embedded close enough.
+        """
+        if speculative_retrieval is not None:
+            if not first_turn:
+                similarity = cosine_similarity(
+                    get_query_embedding(user_input),
+                    get_query_embedding(disambiguated_question),
+                )
+            else:
+                similarity = 1.0
+            logging.info(f"Raw and disambiguated question similarity: {similarity:.4f}")
+            if similarity >= chatbot_parameters_dict["speculation_threshold"]:
+                record_speculation("hit")
+                return speculative_retrieval.result(), "hit"
+            speculative_retrieval.cancel()
+            record_speculation("miss")
+        index_response = get_index_response(
+            disambiguated_question,
+            date,
+            ticker=ticker,
+            local_run=local_run,
+            search_size=aoss_parameters_dict["search_size"],
+        )
+        return index_response, "miss" if speculative_retrieval is not None else "off"
+
+    def answer_generator(
+        self,
+        answer_chunks,
+        user_input,
+        disambiguated_question,
+        stage_times,
+        source,
+        index_response,
+        cache_store=None,
+        cached_question=None,
+        speculation="off",
+    ):
+        """
+        Yield the answer chunks, then log the turn with its timings, add it to
+        the conversation history and store it in the answer cache.
+        :param stage_times: start, disambiguation and retrieval end times of the turn
+        :param cache_store: callable storing the answer, its sources and index response
+        :param cached_question: question whose cached answer is being replayed
+        :param speculation: outcome of the speculative retrieval, see retrieve
+        """
+        start_time, disambiguate_time, retreive_time = stage_times
+        first_token_time = None
+        response_chunks = []
+        for chunk in answer_chunks:
+            if first_token_time is None:
+                first_token_time = datetime.datetime.now()
+            response_chunks.append(chunk)
+            yield chunk
+        response = "".join(response_chunks)
+        answer_time = datetime.datetime.now()
+        if first_token_time is None:
+            first_token_time = answer_time
+        with open(conversation_log, "w") as conversation_log_file:
+            question_answer_internal = f"{self.separator_user}{user_input}\n(WHICH I UNDERSTAND TO MEAN: {disambiguated_question})\n"
+            if cached_question is not None:
+                question_answer_internal += f"(ANSWERED FROM CACHE FOR: {cached_question})\n"
+            question_answer_internal += f"{self.separator_chatbot}{response}"
+            question_answer_external = f"{self.separator_user}{user_input}\n{self.separator_chatbot}{response}"
+            self.memory.append(question_answer_external)
+            conversation_log_file.write(question_answer_internal)
+            seconds_to_disambiguate = (disambiguate_time - start_time).seconds
+            seconds_to_retreive = (retreive_time - disambiguate_time).seconds
+            seconds_to_summarize = (answer_time - retreive_time).seconds
+            seconds_total = (answer_time - start_time).seconds
+            seconds_to_first_token = round(
+                (first_token_time - start_time).total_seconds(), 2
+            )
+            timing = f"\TOTAL TIME: {seconds_total} SECONDS; FIRST TOKEN AFTER {seconds_to_first_token} SECONDS; DISAMBIGUATION TOOK {seconds_to_disambiguate} SECONDS; RETREIVAL TOOK {seconds_to_retreive} SECONDS (SPECULATION: {speculation.upper()}); SUMMARIZATION TOOK {seconds_to_summarize} SECONDS"
+            print(timing)
+            conversation_log_file.write(timing)
+            with open(answer_timing_log, "a") as log_file:
+                log_file.write(
+                    f'{datetime.datetime.now()},{seconds_total},{seconds_to_first_token},{seconds_to_disambiguate},{seconds_to_retreive},{seconds_to_summarize},{speculation},"{user_input}"","{disambiguated_question}"\n'
+                )
+        if cache_store is not None:
+            cache_store(response, source, index_response)
+        elif cached_question is not None:
+            logging.info(f"Answer cache stats: {get_answer_cache().stats()}")
+        logging.info(f"Bedrock client stats: {bedrock_call_stats.stats()}")
+
     def greeting(self):
         return "Hello! I'm ProxyBot. What would you like to know about this vote or the proxy voting process in general?"
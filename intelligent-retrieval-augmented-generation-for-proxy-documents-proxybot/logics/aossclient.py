@@ -1,34 +1,92 @@
+import threading
 from parameters.logger import get_logger
-from parameters.parameters import config
-from awsmanager.manager import AWSClientSession, AWSSecretsManager
+from parameters.parameters import config, aws_clients_dict
+from awsmanager.manager import AWSSecretsManager
 from parameters.parameters import AWS_DEFAULT_REGION
 from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
 
 
 logging = get_logger(__name__)
-aws_session = AWSClientSession()
+
+
+class OpenSearchClientPool:
+    def __init__(self):
+        """
+        Process-wide OpenSearch clients keyed by (host, index, region).
+        A client keeps its HTTP connection pool and signer for the life of the process.
+        The signer reads the session credentials on every request, so refreshed
+        credentials are picked up without building a new client.
+        """
+        self.clients = {}
+        self.reuses = {}
+        self.lock = threading.Lock()
+
+    def get(self, host, port, index, region, credentials):
+        key = (host, index, region)
+        with self.lock:
+            if key in self.clients:
+                self.reuses[key] += 1
+                logging.info(
+                    f"Reusing OpenSearch client for {host}/{index} ({self.reuses[key]} reuses)"
+                )
+                return self.clients[key]
+            self.clients[key] = OpenSearch(
+                hosts=[{"host": host, "port": port}],
+                http_auth=AWSV4SignerAuth(credentials, region, "aoss"),
+                use_ssl=True,
+                verify_certs=True,
+                connection_class=RequestsHttpConnection,
+                pool_maxsize=aws_clients_dict["aoss_pool_maxsize"],
+                timeout=aws_clients_dict["aoss_timeout"],
+            )
+            self.reuses[key] = 0
+            logging.info(f"Created OpenSearch client for {host}/{index} in {region}")
+            return self.clients[key]
+
+    @staticmethod
+    def connection_counts(client):
+        """Return the HTTP connections opened and requests sent by a client."""
+        connections, requests = 0, 0
+        for connection in client.transport.connection_pool.connections:
+            for adapter in set(connection.session.adapters.values()):
+                http_pools = adapter.poolmanager.pools
+                # keys() is the only thread-safe view of the urllib3 pools
+                for pool_key in http_pools.keys():
+                    http_pool = http_pools.get(pool_key)
+                    if http_pool is None:
+                        continue
+                    connections += http_pool.num_connections
+                    requests += http_pool.num_requests
+        return connections, requests
+
+    def stats(self):
+        with self.lock:
+            clients = dict(self.clients)
+            reuses = dict(self.reuses)
+        stats = {}
+        for (host, index, region), client in clients.items():
+            connections, requests = self.connection_counts(client)
+            stats[f"{host}/{index}@{region}"] = {
+                "client_reuses": reuses[(host, index, region)],
+                "connections": connections,
+                "requests": requests,
+            }
+        return stats
+
+
+aoss_client_pool = OpenSearchClientPool()
 
 
 def create_aoss_client(session):
     # AOSS Settings
     ASM = AWSSecretsManager(session)
     aoss_secrets = ASM.get_secret_credentials(config["secret"]["aoss_credentials_name"])
-    # TO BE DELETED
-    print(f"<<<ONLY FOR VALIDATION>>>{aoss_secrets}")
     aoss_host = aoss_secrets["aoss_host"]
     aoss_port = aoss_secrets["aoss_port"]
     aoss_index = aoss_secrets["aoss_index"]
     aoss_region = AWS_DEFAULT_REGION
-    service = "aoss"
     credentials = session.obtain_credentials()
-    aoss_auth = AWSV4SignerAuth(credentials, aoss_region, service)
-    _client = OpenSearch(
-        hosts=[{"host": aoss_host, "port": aoss_port}],
-        http_auth=aoss_auth,
-        use_ssl=True,
-        verify_certs=True,
-        connection_class=RequestsHttpConnection,
-        pool_maxsize=20,
-        timeout=50000,
+    _client = aoss_client_pool.get(
+        aoss_host, aoss_port, aoss_index, aoss_region, credentials
     )
     return _client, aoss_index
@@ -84,7 +84,32 @@ class BedrockQueries:
             )
         return answer
 
-    def get_conversation_response(
+    def summarize_conversation(self, summary, turns_text, max_tokens):
+        """Fold conversation turns into the running summary of the earlier conversation."""
+        user_message = f"Here is the summary of the earlier conversation between a customer and 'ProxyBot' in the <SUMMARY> XML tag, and the turns that followed it in the <TURNS> XML tag.\n"
+        user_message += f"\n\n<SUMMARY>\n{summary}\n</SUMMARY>\n\n<TURNS>\n{turns_text}\n</TURNS>\n\n"
+        user_message += f"Update the summary with the <TURNS>. Keep the company, the people, proposals, figures and the questions the customer asked, drop the quotes.\n"
+        user_message += f"Use less than {int(max_tokens * 0.75)} words and return only the updated summary."
+        logging.info(f"Summarizing conversation with model: {self.model_id}...")
+        prompt_config = {
+            "messages": [
+                {"role": "user", "content": [{"type": "text", "text": user_message}]}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0,
+            "anthropic_version": "bedrock-2023-05-31",
+        }
+        body = json.dumps(prompt_config)
+        bedrock_answer = self.bedrock_client.invoke_model(
+            body=body,
+            modelId=self.model_id,
+            accept="application/json",
+            contentType="application/json",
+        )
+        response_body = json.loads(bedrock_answer.get("body").read())
+        return response_body.get("content")[0].get("text")
+
+    def conversation_request_body(
         self, disambiguated_question, answer_data, conversation_history
     ):
 
@@ -125,8 +150,6 @@ class BedrockQueries:
             )
 
         logging.info(f"Sending conversation question: {disambiguated_question.strip()}")
-        accept = "application/json"
-        contentType = "application/json"
         logging.info(f"Using model: {self.model_id}...")
 
         messages = [
@@ -144,7 +167,16 @@ class BedrockQueries:
             "stop_sequences": ["user:"],
         }
 
-        body = json.dumps(prompt_config)
+        return json.dumps(prompt_config)
+
+    def get_conversation_response(
+        self, disambiguated_question, answer_data, conversation_history
+    ):
+        body = self.conversation_request_body(
+            disambiguated_question, answer_data, conversation_history
+        )
+        accept = "application/json"
+        contentType = "application/json"
         bedrock_answer = self.bedrock_client.invoke_model(
             body=body, modelId=self.model_id, accept=accept, contentType=contentType
         )
@@ -155,3 +187,33 @@ class BedrockQueries:
         with open(chatbot_log, "w") as log_file:
             log_file.write(f"########## CONVERSTION ANSWER: ###############\n{answer}")
         return answer
+
+    def stream_conversation_response(
+        self, disambiguated_question, answer_data, conversation_history
+    ):
+        """
+        Same prompt as get_conversation_response, but yields the answer text
+        chunk by chunk as Bedrock generates it.
+        """
+        body = self.conversation_request_body(
+            disambiguated_question, answer_data, conversation_history
+        )
+        accept = "application/json"
+        contentType = "application/json"
+        bedrock_answer = self.bedrock_client.invoke_model_with_response_stream(
+            body=body, modelId=self.model_id, accept=accept, contentType=contentType
+        )
+        answer_chunks = []
+        for event in bedrock_answer.get("body"):
+            chunk = event.get("chunk")
+            if chunk is None:
+                continue
+            message = json.loads(chunk.get("bytes"))
+            if message.get("type") == "content_block_delta":
+                text = message.get("delta", {}).get("text", "")
+                if text:
+                    answer_chunks.append(text)
+                    yield text
+        answer = "".join(answer_chunks)
+        with open(chatbot_log, "w") as log_file:
+            log_file.write(f"########## CONVERSTION ANSWER: ###############\n{answer}")
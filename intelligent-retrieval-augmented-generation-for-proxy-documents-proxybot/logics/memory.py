@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from parameters.logger import get_logger
+from utils.utils import estimate_tokens, truncate_to_tokens
+
+
+logging = get_logger(__name__)
+
+# Summaries are updated off the answer path, the next turn waits for its own session only
+summary_executor = ThreadPoolExecutor(max_workers=4)
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        summarize=None,
+        token_budget=4000,
+        recent_turns=4,
+        summary_token_budget=500,
+    ):
+        """
+        Conversation history bounded by a token budget.
+        The last recent_turns turns are kept verbatim, older turns, or recent ones
+        once the budget is exceeded, are folded into a running summary in the background.
+        :param summarize: callable(summary, turns_text, max_tokens) returning the updated
+            summary, folded turns are dropped when None
+        :param token_budget: maximum estimated tokens of the summary and verbatim turns
+        :param recent_turns: number of latest turns kept verbatim
+        :param summary_token_budget: maximum estimated tokens of the summary
+        """
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_token_budget = summary_token_budget
+        self.turns = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.pending_summary = None
+        self.lock = threading.Lock()
+
+    def _total_tokens(self):
+        return self.summary_tokens + sum(turn["tokens"] for turn in self.turns)
+
+    def append(self, text):
+        """Add a turn, folding the oldest turns into the summary when over budget."""
+        folded_turns = []
+        with self.lock:
+            self.turns.append({"text": text, "tokens": estimate_tokens(text)})
+            while len(self.turns) > 1 and (
+                len(self.turns) > self.recent_turns
+                or self._total_tokens() > self.token_budget
+            ):
+                folded_turns.append(self.turns.pop(0))
+            if folded_turns:
+                # Chained so that summaries are always updated in turn order
+                self.pending_summary = summary_executor.submit(
+                    self._update_summary, folded_turns, self.pending_summary
+                )
+        logging.info(f"Conversation memory: {self.stats()}")
+
+    def _update_summary(self, folded_turns, previous_summary):
+        if previous_summary is not None:
+            previous_summary.result()
+        folded_text = "\n\n".join(turn["text"] for turn in folded_turns)
+        summary = ""
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(
+                    self.summary, folded_text, self.summary_token_budget
+                )
+            except Exception as error:
+                logging.error(f"Conversation summary failed, keeping previous one: {error}")
+                summary = self.summary
+        summary = truncate_to_tokens(summary.strip(), self.summary_token_budget)
+        with self.lock:
+            self.summary = summary
+            self.summary_tokens = estimate_tokens(summary)
+        logging.info(
+            f"Folded {len(folded_turns)} turns into a {self.summary_tokens} token summary"
+        )
+
+    def as_list(self):
+        """Return the summary and verbatim turns, in the shape of the former history list."""
+        pending_summary = self.pending_summary
+        if pending_summary is not None:
+            pending_summary.result()
+        with self.lock:
+            history = [turn["text"] for turn in self.turns]
+            if self.summary:
+                history.insert(0, f"SUMMARY OF THE EARLIER CONVERSATION:\n{self.summary}")
+        return history
+
+    def stats(self):
+        with self.lock:
+            return {
+                "turns": len(self.turns),
+                "turn_tokens": [turn["tokens"] for turn in self.turns],
+                "summary_tokens": self.summary_tokens,
+                "total_tokens": self._total_tokens(),
+            }
@@ -0,0 +1,122 @@
+import re
+import json
+import datetime
+import threading
+from parameters.parameters import log_files_dict
+from parameters.logger import get_logger
+
+
+logging = get_logger(__name__)
+
+router_log = log_files_dict["router_log"]
+router_log_lock = threading.Lock()
+
+# Words that only make sense with the previous turns
+ANAPHORA_PATTERN = re.compile(
+    r"\b(it|its|it's|they|them|their|theirs|this|that|these|those|he|him|his|she|"
+    r"her|hers|former|latter|above|previous|previously|same|also|again|else|"
+    r"another|other|more|instead|then)\b",
+    re.IGNORECASE,
+)
+PROPOSAL_PATTERN = re.compile(
+    r"\b(proposal|item|resolution)\s*(no\.?|number|#)?\s*\d+\b", re.IGNORECASE
+)
+# Resolved by an explicit company mention in the same question. Plural pronouns are left
+# out, in proxy questions they usually refer to directors or executives
+COMPANY_PRONOUNS = {"it", "its", "it's"}
+MIN_QUESTION_WORDS = 4
+
+
+class QuestionRouter:
+    def __init__(self, bedrock_client, router_model_id=None):
+        """
+        Decide whether a question has to be disambiguated before retrieval.
+        Cheap local checks route self-contained questions straight to retrieval.
+        When they are inconclusive, router_model_id is asked if set, otherwise
+        the question is disambiguated. Every decision is appended to the router log.
+        :param bedrock_client: Bedrock runtime client used for router_model_id
+        :param router_model_id: optional small model confirming self-contained questions
+        """
+        self.bedrock_client = bedrock_client
+        self.router_model_id = router_model_id
+
+    @staticmethod
+    def mentions_company(question, company, ticker):
+        return any(
+            re.search(rf"\b{re.escape(name)}\b", question, re.IGNORECASE)
+            for name in (company, ticker)
+        )
+
+    def local_route(self, question, conversation_history, company, ticker):
+        """Return (needs_disambiguation, reason), needs_disambiguation is None when inconclusive."""
+        if len(question.split()) < MIN_QUESTION_WORDS:
+            return True, "short question"
+        if not conversation_history:
+            return False, "first turn"
+        anaphora = {word.lower() for word in ANAPHORA_PATTERN.findall(question)}
+        company_mentioned = self.mentions_company(question, company, ticker)
+        if company_mentioned:
+            anaphora -= COMPANY_PRONOUNS
+        if anaphora:
+            return None, f"anaphora: {', '.join(sorted(anaphora))}"
+        if company_mentioned:
+            return False, "explicit company"
+        if PROPOSAL_PATTERN.search(question):
+            return False, "explicit proposal"
+        return None, "no explicit entity"
+
+    def model_route(self, question, conversation_history):
+        """Ask the router model whether the question is understandable without the conversation."""
+        user_message = (
+            f"Here is the last answer of a conversation:\n<CONTEXT>\n{conversation_history[-1]}\n</CONTEXT>\n"
+            f"Here is the next question:\n<QUESTION>\n{question}\n</QUESTION>\n"
+            "Can the question be understood without the <CONTEXT>? Answer with YES or NO only."
+        )
+        prompt_config = {
+            "messages": [
+                {"role": "user", "content": [{"type": "text", "text": user_message}]}
+            ],
+            "max_tokens": 5,
+            "temperature": 0,
+            "anthropic_version": "bedrock-2023-05-31",
+        }
+        bedrock_answer = self.bedrock_client.invoke_model(
+            body=json.dumps(prompt_config),
+            modelId=self.router_model_id,
+            accept="application/json",
+            contentType="application/json",
+        )
+        response_body = json.loads(bedrock_answer.get("body").read())
+        answer = response_body.get("content")[0].get("text")
+        return not answer.strip().upper().startswith("YES")
+
+    def route(self, question, conversation_history, company, ticker):
+        """
+        Return True when the question has to be disambiguated before retrieval.
+        :param conversation_history: previous turns of the conversation
+        :param company: company name selected in the app
+        :param ticker: ticker of the company
+        """
+        start_time = datetime.datetime.now()
+        needs_disambiguation, reason = self.local_route(
+            question, conversation_history, company, ticker
+        )
+        if needs_disambiguation is None:
+            if self.router_model_id:
+                try:
+                    needs_disambiguation = self.model_route(question, conversation_history)
+                    reason = f"{reason}, {self.router_model_id}"
+                except Exception as error:
+                    logging.error(f"Router model failed, disambiguating: {error}")
+                    needs_disambiguation = True
+            else:
+                needs_disambiguation = True
+        route = "disambiguate" if needs_disambiguation else "direct"
+        seconds_to_route = round((datetime.datetime.now() - start_time).total_seconds(), 3)
+        logging.info(f"Routed question to {route} ({reason}) in {seconds_to_route}s: {question}")
+        with router_log_lock:
+            with open(router_log, "a") as log_file:
+                log_file.write(
+                    f'{datetime.datetime.now()},{route},"{reason}",{seconds_to_route},"{question}"\n'
+                )
+        return needs_disambiguation
@@ -1,3 +1,4 @@
+import os
 import sys
 import logging
 from parameters.parameters import log_files_dict
@@ -8,6 +9,17 @@ formatter = logging.Formatter(
 )
 
 
+class DelayedFileHandler(logging.FileHandler):
+    """File handler creating its folder and file on the first record, not on import."""
+
+    def __init__(self, filename):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 def get_console_handler():
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
@@ -15,7 +27,7 @@ def get_console_handler():
 
 
 def get_file_handler():
-    file_handler = logging.FileHandler(log_files_dict["execution_log"])
+    file_handler = DelayedFileHandler(log_files_dict["execution_log"])
     file_handler.setFormatter(formatter)
     return file_handler
 
@@ -3,7 +3,7 @@ import datetime
 import uuid
 import random
 import configparser
-import boto3
+
 
 def check_folder_exists(folder):
     if not os.path.exists(folder):
@@ -27,14 +27,23 @@ aoss_logs_folder = os.path.join(log_folder, "aoss_logs")
 data_path = os.path.join(main_path, "data")
 text_data_path = os.path.join(main_path, "text_data")
 key_folder = os.path.join(main_path, "keys")
+cache_folder = os.path.join(main_path, "cache")
+
+
+def create_folders():
+    """Create the working folders, called by the entry points rather than on import."""
+    for folder in (
+        log_folder,
+        chatbot_logs_folder,
+        textract_logs_folder,
+        reviews_logs_folder,
+        aoss_logs_folder,
+        text_data_path,
+        key_folder,
+        cache_folder,
+    ):
+        check_folder_exists(folder)
 
-check_folder_exists(log_folder)
-check_folder_exists(chatbot_logs_folder)
-check_folder_exists(textract_logs_folder)
-check_folder_exists(reviews_logs_folder)
-check_folder_exists(aoss_logs_folder)
-check_folder_exists(text_data_path)
-check_folder_exists(key_folder)
 
 timestamp_string = NOW.strftime("%Y-%m-%d")
 chat_timestamp_string = NOW.strftime("%Y-%m-%d_%H-%M-%S")
@@ -45,6 +54,8 @@ reviews_log = f"reviews_{timestamp_string}.log"
 
 bedrock_performance_file = "BEDROCK_PERF.csv"
 answer_timing_file = "ANSWER_TIMING.csv"
+source_fetch_timing_file = "SOURCE_FETCH_TIMING.csv"
+router_decisions_file = "ROUTER_DECISIONS.csv"
 
 log_files_dict = {
     "chats_log": os.path.join(chatbot_logs_folder, f"CHAT_{chat_timestamp_string}.log"),
@@ -62,6 +73,10 @@ log_files_dict = {
         chatbot_logs_folder, bedrock_performance_file
     ),
     "answer_timing_log": os.path.join(chatbot_logs_folder, answer_timing_file),
+    "source_fetch_timing_log": os.path.join(
+        chatbot_logs_folder, source_fetch_timing_file
+    ),
+    "router_log": os.path.join(chatbot_logs_folder, router_decisions_file),
     "aoss_credential": os.path.join(key_folder, "aoss_credential.json"),
 }
 
@@ -108,11 +123,16 @@ colour_dict = {"c_red": "\x1b[31m", "c_green": "\033[92m", "c_norm": "\033[0m"}
 
 DISAMBIGUITY_CLAUSE = False
 AWS_DEFAULT_REGION = config["aws_params"]["region_name"]
-boto3.setup_default_session(region_name=AWS_DEFAULT_REGION)
-print(f"************* SET BOTO3 Default region: {boto3.DEFAULT_SESSION.region_name} *****************")
-aws_session = boto3.Session()
-session_region = aws_session.region_name
-print(f"*************  BOTO3 region: {session_region} *****************")
+
+
+def setup_default_boto3_session():
+    """Point the boto3 default session at AWS_DEFAULT_REGION, done on first AWS use."""
+    # boto3 is imported here to keep it off the import path of every module
+    import boto3
+
+    boto3.setup_default_session(region_name=AWS_DEFAULT_REGION)
+    return boto3.DEFAULT_SESSION
+
 
 rd = random.Random()
 rd.seed(42)
@@ -137,10 +157,107 @@ ticker_dict = dict(zip(ticker_company_name, ticker_list))
 
 aoss_parameters_dict = {
     "bulk_limit": 256,
+    "bulk_max_bytes": 10 * 1024 * 1024,  # Payload size limit per bulk request
+    "bulk_max_retries": 3,
+    "bulk_backoff_seconds": 2,
     "chunk_size": 3000,
     "chunk_overlap": 100,
     "vector_size": 1536,  # Bedrock Titan Embedding limit
     "search_size": 3,
+    "retrieval_mode": "hybrid",  # "hybrid" fuses BM25 and kNN results, "knn" is vector only
+    "rrf_k": 60,  # Reciprocal rank fusion constant
+    "hybrid_candidates": 10,  # Hits fetched by each query before fusion
+    "rerank": True,  # Re-rank an over-fetched candidate pool with MMR and lexical overlap
+    "rerank_candidates": 20,
+    "mmr_lambda": 0.7,  # 1 ranks by relevance only, lower values favour diversity
+    "lexical_weight": 0.2,  # Share of question term overlap in the relevance score
+    "query_embedding_cache_size": 1024,  # Questions kept in the in-process LRU
+    "context_mode": "chunk",  # "chunk" packs the retrieved chunks, "file" inlines whole sources
+    "context_token_budget": 6000,  # Estimated tokens of the packed chunk context
+    "context_neighbour_chunks": 0,  # Chunks of surrounding source text added on each side
+    "embedding_workers": 8,  # Concurrent Bedrock embedding requests
+    "embedding_retries": 2,
+    "ingestion_workers": 4,  # Ticker/year units ingested in parallel
+    "incremental_ingestion": True,  # Skip chunks already indexed by content_hash
+    "delete_stale_chunks": False,  # Remove indexed chunks no longer in the filing
+    "indexed_hashes_limit": 10000,  # AOSS maximum result window
+    "readiness_timeout": 900,  # Deadline in seconds for index and collection setup
+    "readiness_max_delay": 30,  # Upper bound in seconds between readiness checks
+}
+
+s3_transfer_dict = {
+    "upload_workers": 8,  # Files uploaded in parallel
+    "multipart_threshold": 8 * 1024 * 1024,
+    "multipart_chunksize": 8 * 1024 * 1024,
+    "max_concurrency": 4,  # Parts uploaded in parallel per file
+}
+
+textract_parameters_dict = {
+    "max_concurrent_jobs": 10,  # Stay within the account StartDocumentAnalysis quota
+    "poll_initial_delay": 5,
+    "poll_max_delay": 60,
+    "job_timeout": 3600,
+    "analysis_cache_path": os.path.join(cache_folder, "textract"),
+    "s3_analysis_cache": True,  # Mirror raw analyses to the PDF bucket
+    "s3_analysis_prefix": "textract_cache",
+}
+
+source_cache_dict = {
+    "memory_mb": 64,
+    "disk_path": os.path.join(cache_folder, "sources"),
+    "validation_seconds": 300,  # Serve cached files without an ETag check for this long
+    "fetch_workers": 4,  # Source files fetched in parallel per question
+}
+
+embedding_cache_dict = {
+    "enabled": True,
+    "db_path": os.path.join(cache_folder, "embeddings.sqlite"),
+    "max_size_mb": 512,
+}
+
+chatbot_parameters_dict = {
+    # Send self-contained questions straight to retrieval, skipping disambiguation
+    "fast_path_routing": True,
+    # Optional small model asked when the local checks are inconclusive, None to disambiguate
+    "router_model_id": None,  # e.g. "anthropic.claude-3-haiku-20240307-v1:0"
+    # Retrieve on the raw question while it is being disambiguated
+    "speculative_retrieval": True,
+    "speculation_threshold": 0.9,  # Cosine similarity to reuse the speculative results
+    "speculation_workers": 8,
+    # Conversation memory, older turns are folded into a summary beyond these limits
+    "memory_token_budget": 4000,
+    "memory_recent_turns": 4,
+    "memory_summary_tokens": 500,
+    "memory_summary_model_id": None,  # None summarizes with the chat model
+}
+
+answer_cache_dict = {
+    "enabled": True,
+    "similarity_threshold": 0.97,  # Cosine similarity of two questions sharing an answer
+    "ttl_seconds": 3600,
+    "max_entries": 1000,
+    # Written by the ingestion, cached answers older than their ticker/year stamp are dropped
+    "ingestion_stamps_path": os.path.join(cache_folder, "ingestion_stamps.json"),
+}
+
+vector_store_dict = {
+    # "aoss" for OpenSearch Serverless, "local" for the file backed store used offline
+    "backend": config.get("vector_store", "backend", fallback="aoss").strip().lower(),
+    "local_path": os.path.join(cache_folder, "vector_store"),
+}
+
+aws_clients_dict = {
+    "secret_ttl_seconds": 900,  # Secrets Manager values are fetched again after this long
+    "aoss_pool_maxsize": 20,  # HTTP connections kept open per OpenSearch client
+    "aoss_timeout": 50000,
+    # One Bedrock runtime client is shared by all threads, sized for the busiest process:
+    # the ingestion embeds with embedding_workers per unit and ingestion_workers units
+    "bedrock_max_pool_connections": max(
+        aoss_parameters_dict["ingestion_workers"] * aoss_parameters_dict["embedding_workers"],
+        chatbot_parameters_dict["speculation_workers"] + 8,
+    ),
+    "bedrock_max_attempts": 8,
+    "bedrock_retry_mode": "adaptive",  # Client side rate limiting on top of jittered backoff
 }
 
 task_prefix = config["opensearch"]["task_prefix"]
@@ -155,7 +272,6 @@ aoss_params = dict(
 
 try:
     aws_profile = config.get("aws_params", "profile_name", fallback=None)
-    print(f"Set profile: {aws_profile}")
     if aws_profile is not None and aws_profile == "":
         aws_profile = None
     if aws_profile == "None":
@@ -0,0 +1,43 @@
+import sys
+import subprocess
+
+
+# Import time budgets in milliseconds. Importing these modules must stay free of
+# AWS calls, client creation and slow optional imports such as langchain, which
+# all belong to the first use of the service (see awsmanager/registry.py).
+IMPORT_BUDGETS_MS = {
+    "parameters.parameters": 150,
+    "awsmanager.registry": 300,
+    "data_pipeline.search": 1500,
+    "logics.aossbot": 1500,
+}
+
+
+def measure_import_ms(module):
+    """Import module in a fresh interpreter and return its cumulative import time in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+over_budget = []
+for module, budget_ms in IMPORT_BUDGETS_MS.items():
+    import_ms = measure_import_ms(module)
+    status = "OK" if import_ms <= budget_ms else "OVER BUDGET"
+    print(f"{module}: {import_ms:.0f} ms (budget {budget_ms} ms) {status}")
+    if import_ms > budget_ms:
+        over_budget.append(module)
+
+if over_budget:
+    print(f"Import time budget exceeded by {', '.join(over_budget)}")
+    sys.exit(1)
@@ -0,0 +1,105 @@
+import sys
+import hashlib
+import tempfile
+from vectorstore import LocalVectorStore
+from data_pipeline.bulk_indexer import BulkIndexer
+from data_pipeline.search import search_filters
+from data_pipeline.pipeline import get_indexed_hashes
+
+
+# Round trip of the local vector store: documents are indexed in the shape written by
+# bulk_ingest_data and persisted, then read back from a new store on the same folder
+# with the filters used by retrieval and by the incremental ingestion.
+# Runs offline, no AWS access is needed.
+TICKER = "AAPL"
+DOCUMENT_DATE = 2023  # An int, as the ingestion loops over range(START_YEAR, ...)
+INDEX_NAME = "check-index"
+CHUNKS = [
+    "The board recommends a vote FOR the election of each director nominee.",
+    "Executive compensation is reviewed by the compensation committee every year.",
+    "Shareholders may submit proposals for the next annual meeting.",
+]
+
+
+def check(description, condition):
+    print(f"{description}: {'OK' if condition else 'FAILED'}")
+    return condition
+
+
+with tempfile.TemporaryDirectory() as store_path:
+    store = LocalVectorStore(store_path)
+    store.indices.create(
+        index=INDEX_NAME,
+        body={
+            "mappings": {
+                "properties": {"vector_title": {"type": "knn_vector", "dimension": 3}}
+            }
+        },
+    )
+    with BulkIndexer(store, INDEX_NAME) as indexer:
+        for position, chunk in enumerate(CHUNKS):
+            indexer.index(
+                {
+                    "company": TICKER,
+                    "document_date": DOCUMENT_DATE,
+                    "content_hash": hashlib.sha256(chunk.encode()).hexdigest(),
+                    "page_content": chunk,
+                    "metadata": {"source": f"text_data/{TICKER}/chunk_{position}.txt"},
+                    "vector_title": [float(position == axis) for axis in range(3)],
+                }
+            )
+    unsaved_response = LocalVectorStore(store_path).search(index=INDEX_NAME, body={})
+    store.indices.refresh(index=INDEX_NAME)
+    # A new store reads the index back from its files, as the app does
+    store = LocalVectorStore(store_path)
+
+    filters = search_filters(TICKER, DOCUMENT_DATE)
+    knn_response = store.search(
+        index=INDEX_NAME,
+        body={
+            "size": 2,
+            "query": {
+                "bool": {
+                    "must": {"knn": {"vector_title": {"vector": [1.0, 0.0, 0.0], "k": 2}}},
+                    "filter": filters,
+                }
+            },
+        },
+    )
+    match_response = store.search(
+        index=INDEX_NAME,
+        body={
+            "size": 2,
+            "query": {
+                "bool": {
+                    "must": {"match": {"page_content": "compensation committee"}},
+                    "filter": filters,
+                }
+            },
+        },
+    )
+    other_year_response = store.search(
+        index=INDEX_NAME,
+        body={"query": {"bool": {"filter": search_filters(TICKER, DOCUMENT_DATE - 1)}}},
+    )
+    indexed_hashes = get_indexed_hashes(store, INDEX_NAME, TICKER, DOCUMENT_DATE)
+
+    results = [
+        check("Indexed chunks", indexer.summary()["indexed"] == len(CHUNKS)),
+        check("Nothing written before the refresh", not unsaved_response["hits"]["hits"]),
+        check(
+            "kNN search with the retrieval filters",
+            [hit["_source"]["page_content"] for hit in knn_response["hits"]["hits"]][:1]
+            == CHUNKS[:1],
+        ),
+        check(
+            "BM25 search with the retrieval filters",
+            [hit["_source"]["page_content"] for hit in match_response["hits"]["hits"]][:1]
+            == CHUNKS[1:2],
+        ),
+        check("Other document date filtered out", not other_year_response["hits"]["hits"]),
+        check("Indexed hashes found for incremental ingestion", len(indexed_hashes) == len(CHUNKS)),
+    ]
+
+if not all(results):
+    sys.exit(1)
@@ -0,0 +1,84 @@
+import os
+import gzip
+import json
+from botocore.exceptions import ClientError
+from textract.textract_logger import get_logger
+
+
+logging = get_logger(__name__)
+
+
+class TextractAnalysisCache:
+    def __init__(self, cache_path, s3_client=None, bucket_name=None, s3_prefix=None):
+        """
+        Store raw Textract analysis responses as gzip compressed JSON.
+        Analyses are keyed by the PDF content hash and the Textract feature set,
+        so a changed PDF or feature set never reuses a stale analysis.
+        :param cache_path: local folder of the cached analyses
+        :param s3_client: optional S3 client to mirror analyses to bucket_name
+        :param bucket_name: optional bucket mirroring the local cache
+        :param s3_prefix: key prefix of the mirrored analyses in the bucket
+        """
+        self.cache_path = cache_path
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_prefix = s3_prefix
+
+    @staticmethod
+    def file_name(ticker, year, pdf_hash, features):
+        feature_names = "-".join(sorted(feature.name for feature in features))
+        return f"{ticker}_{year}_{pdf_hash}_{feature_names}.json.gz"
+
+    def _local_path(self, ticker, file_name):
+        return os.path.join(self.cache_path, ticker, file_name)
+
+    def _s3_key(self, ticker, file_name):
+        return f"{self.s3_prefix}/{ticker}/{file_name}"
+
+    def load(self, ticker, year, pdf_hash, features):
+        """Return the cached raw analysis response, or None when it was never stored."""
+        file_name = self.file_name(ticker, year, pdf_hash, features)
+        local_path = self._local_path(ticker, file_name)
+        if os.path.exists(local_path):
+            with gzip.open(local_path, "rt", encoding="utf-8") as file:
+                logging.info(f"Loaded cached Textract analysis {local_path}")
+                return json.load(file)
+        if self.s3_client and self.bucket_name:
+            try:
+                response = self.s3_client.get_object(
+                    Bucket=self.bucket_name, Key=self._s3_key(ticker, file_name)
+                )
+            except ClientError as error:
+                if error.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    return None
+                raise
+            compressed = response["Body"].read()
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(local_path, "wb") as file:
+                file.write(compressed)
+            logging.info(f"Loaded cached Textract analysis from s3 for {file_name}")
+            return json.loads(gzip.decompress(compressed).decode("utf-8"))
+        return None
+
+    def save(self, ticker, year, pdf_hash, features, response):
+        file_name = self.file_name(ticker, year, pdf_hash, features)
+        local_path = self._local_path(ticker, file_name)
+        # Years of the same ticker are processed concurrently
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        compressed = gzip.compress(json.dumps(response).encode("utf-8"))
+        temp_path = f"{local_path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(compressed)
+        os.replace(temp_path, local_path)
+        logging.info(f"Saved Textract analysis to {local_path}")
+        if self.s3_client and self.bucket_name:
+            s3_key = self._s3_key(ticker, file_name)
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Body=compressed,
+                ContentType="application/json",
+                ContentEncoding="gzip",
+            )
+            logging.info(f"Saved Textract analysis to s3://{self.bucket_name}/{s3_key}")
+        return local_path
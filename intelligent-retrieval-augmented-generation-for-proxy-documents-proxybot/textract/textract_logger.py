@@ -2,6 +2,7 @@ import sys
 import logging
 import datetime
 from parameters.parameters import log_files_dict
+from parameters.logger import DelayedFileHandler
 
 timestamp_string = datetime.datetime.now().strftime("%Y-%m-%d")
 textract_log = log_files_dict["textract_log"]
@@ -18,7 +19,7 @@ def get_console_handler():
 
 
 def get_file_handler():
-    file_handler = logging.FileHandler(textract_log)
+    file_handler = DelayedFileHandler(textract_log)
     file_handler.setFormatter(formatter)
     return file_handler
 
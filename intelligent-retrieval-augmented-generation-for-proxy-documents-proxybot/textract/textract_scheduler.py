@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from parameters.parameters import textract_parameters_dict
+from textract.textract_logger import get_logger
+
+
+logging = get_logger(__name__)
+
+
+class TextractJobScheduler:
+    def __init__(
+        self,
+        max_concurrent_jobs=textract_parameters_dict["max_concurrent_jobs"],
+        poll_initial_delay=textract_parameters_dict["poll_initial_delay"],
+        poll_max_delay=textract_parameters_dict["poll_max_delay"],
+        job_timeout=textract_parameters_dict["job_timeout"],
+    ):
+        """
+        Run many asynchronous Textract analyses at once.
+        Each worker reuses a cached analysis when there is one, otherwise it submits
+        one job, polls it with backoff and stores the raw analysis. The document is
+        linearized and saved as soon as it is available, so at most
+        max_concurrent_jobs Textract jobs are in flight at any time.
+        :param max_concurrent_jobs: maximum number of Textract jobs in flight
+        :param poll_initial_delay: first delay between job status checks in seconds
+        :param poll_max_delay: upper bound of the delay between status checks in seconds
+        :param job_timeout: deadline of a single job in seconds
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.poll_initial_delay = poll_initial_delay
+        self.poll_max_delay = poll_max_delay
+        self.job_timeout = job_timeout
+
+    def process(self, extractor):
+        start_time = time.time()
+        document = extractor.load_cached_analysis()
+        if document is None:
+            document = extractor.start_analysis()
+            logging.info(
+                f"Submitted Textract job {document.job_id} for "
+                f"{extractor.ticker} {extractor.year}"
+            )
+            extractor.wait_for_analysis(
+                document,
+                initial_delay=self.poll_initial_delay,
+                max_delay=self.poll_max_delay,
+                timeout=self.job_timeout,
+            )
+            extractor.save_analysis(document)
+        analysis_time = time.time()
+        md_header_splits = extractor.linearize(document)
+        return {
+            "sections": len(md_header_splits),
+            "analysis_seconds": round(analysis_time - start_time, 2),
+            "linearize_seconds": round(time.time() - analysis_time, 2),
+        }
+
+    def run(self, extractors):
+        """
+        Process all extractors and return a dict of (ticker, year) to its summary,
+        or to the raised error for the jobs that failed.
+        """
+        results = {}
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_jobs) as executor:
+            futures = {
+                executor.submit(self.process, extractor): (
+                    extractor.ticker,
+                    extractor.year,
+                )
+                for extractor in extractors
+            }
+            for future in as_completed(futures):
+                ticker, year = futures[future]
+                try:
+                    results[(ticker, year)] = future.result()
+                    logging.info(
+                        f"File {ticker} and {year} processed: {results[(ticker, year)]}"
+                    )
+                except Exception as e:
+                    results[(ticker, year)] = e
+                    logging.error(f"File {ticker} and {year} might not exist")
+                    logging.error(f"Error extracting text from {ticker} {year}")
+                    logging.error(f"Resulting in the following error: {e}")
+        succeeded = sum(
+            1 for result in results.values() if not isinstance(result, Exception)
+        )
+        logging.info(
+            f"{succeeded}/{len(results)} Textract jobs completed in "
+            f"{time.time() - start_time:.2f}s with up to "
+            f"{self.max_concurrent_jobs} concurrent jobs"
+        )
+        return results
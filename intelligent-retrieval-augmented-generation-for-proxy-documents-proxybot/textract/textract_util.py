@@ -1,13 +1,27 @@
 import os
+import glob
+import json
 import boto3
+import shutil
+import hashlib
+import datetime
+import tempfile
 from typing import List
+from botocore.exceptions import ClientError
 from langchain.text_splitter import MarkdownHeaderTextSplitter
 from langchain_core.documents import Document
 from textractor import Textractor
 from textractor.data.constants import TextractFeatures
 from textractor.data.text_linearization_config import TextLinearizationConfig
-from parameters.parameters import check_folder_exists, text_data_path
+from textractor.entities.document import Document as TextractDocument
+from parameters.parameters import (
+    text_data_path,
+    data_path,
+    textract_parameters_dict,
+)
 from textract.textract_logger import get_logger
+from textract.analysis_cache import TextractAnalysisCache
+from utils.utils import wait_until, section_manifest_path, section_swap_marker_path
 
 
 logging = get_logger(__name__)
@@ -35,15 +49,95 @@ class PdfTextExtractor:
             self.textractor = Textractor(profile_name=profile_name)
         else:
             raise ValueError("Either region_name or profile_name must be provided")
+        self.features = [TextractFeatures.LAYOUT, TextractFeatures.TABLES]
+        self.pdf_key = f"{self.ticker}/{self.year}.pdf"
+        self._pdf_hash = None
+        s3_analysis_cache = textract_parameters_dict["s3_analysis_cache"]
+        self.analysis_cache = TextractAnalysisCache(
+            textract_parameters_dict["analysis_cache_path"],
+            s3_client=session.get_s3_client() if s3_analysis_cache else None,
+            bucket_name=bucket_name if s3_analysis_cache else None,
+            s3_prefix=textract_parameters_dict["s3_analysis_prefix"],
+        )
 
-    def extract_text(self):
-        document_file_path = f"s3://{self.bucket_name}/{self.ticker}/{self.year}.pdf"
+    def pdf_content_hash(self):
+        """SHA-256 of the PDF, read from the local data folder when present or else from S3."""
+        if self._pdf_hash is None:
+            sha256 = hashlib.sha256()
+            local_path = os.path.join(data_path, self.ticker, f"{self.year}.pdf")
+            if os.path.exists(local_path):
+                with open(local_path, "rb") as file:
+                    for block in iter(lambda: file.read(1024 * 1024), b""):
+                        sha256.update(block)
+            else:
+                response = self.session.get_s3_client().get_object(
+                    Bucket=self.bucket_name, Key=self.pdf_key
+                )
+                for block in response["Body"].iter_chunks(1024 * 1024):
+                    sha256.update(block)
+            self._pdf_hash = sha256.hexdigest()
+        return self._pdf_hash
+
+    def load_cached_analysis(self):
+        """Return a Textract document rebuilt from the cached raw analysis, if any."""
+        response = self.analysis_cache.load(
+            self.ticker, self.year, self.pdf_content_hash(), self.features
+        )
+        if response is None:
+            return None
+        document = TextractDocument.open(response)
+        document.response = response
+        return document
+
+    def save_analysis(self, document):
+        self.analysis_cache.save(
+            self.ticker,
+            self.year,
+            self.pdf_content_hash(),
+            self.features,
+            document.response,
+        )
+
+    def start_analysis(self):
+        """Submit the asynchronous Textract analysis and return without waiting for it."""
+        document_file_path = f"s3://{self.bucket_name}/{self.pdf_key}"
         logging.info(f"Document path - {document_file_path}")
-        document = self.textractor.start_document_analysis(
+        return self.textractor.start_document_analysis(
             file_source=document_file_path,
-            features=[TextractFeatures.LAYOUT, TextractFeatures.TABLES],
+            features=self.features,
             save_image=False,
         )
+
+    def get_job_status(self, job_id):
+        response = self.textractor.textract_client.get_document_analysis(
+            JobId=job_id, MaxResults=1
+        )
+        return response["JobStatus"]
+
+    def wait_for_analysis(
+        self, document, initial_delay=5, max_delay=60, timeout=3600
+    ):
+        """Poll the Textract job with backoff until it completes."""
+
+        def job_completed():
+            status = self.get_job_status(document.job_id)
+            return status if status != "IN_PROGRESS" else None
+
+        status = wait_until(
+            job_completed,
+            f"Textract job {document.job_id} for {self.ticker} {self.year}",
+            timeout=timeout,
+            initial_delay=initial_delay,
+            max_delay=max_delay,
+            retry_on=(ClientError,),
+        )
+        if status == "FAILED":
+            raise RuntimeError(
+                f"Textract job {document.job_id} for {self.ticker} {self.year} failed"
+            )
+        return status
+
+    def linearize(self, document):
         config = TextLinearizationConfig(
             hide_figure_layout=False,
             hide_header_layout=True,
@@ -58,7 +152,7 @@ class PdfTextExtractor:
         logging.info("Getting content by setting content config")
         content = document.get_text(config=config)
 
-        logging.info(f"{document.document}")
+        logging.info(f"{getattr(document, 'document', document)}")
         headers_to_split_on = [("#", "Header 1")]
 
         markdown_splitter = MarkdownHeaderTextSplitter(
@@ -71,20 +165,95 @@ class PdfTextExtractor:
         logging.info(f"{len(md_header_splits)} chunks to be stored in {text_data_path}")
         self.save_extract_text(md_header_splits)
 
+        return md_header_splits
+
+    def extract_text(self):
+        document = self.load_cached_analysis()
+        if document is None:
+            document = self.start_analysis()
+            self.wait_for_analysis(document)
+            self.save_analysis(document)
+        md_header_splits = self.linearize(document)
         return md_header_splits, document
 
     def save_extract_text(self, md_header_splits):
-        for i, text in enumerate(md_header_splits):
-            text_content = text.page_content
-            if text.metadata:
-                header_name = text.metadata["Header 1"]
-                file_name = f"14A_{self.ticker}_{self.year}_{i:03d}_{header_name}.txt"
-            else:
-                file_name = f"14A_{self.ticker}_{self.year}_{i:03d}.txt"
-            check_folder_exists(os.path.join(self.text_data_path, self.ticker))
-            file_name_path = os.path.join(self.text_data_path, self.ticker, file_name)
-            logging.info(f"{file_name_path}")
-            with open(file_name_path, "a") as output_file:
-                output_file.write(text_content)
-            logging.info(f"Processed {i}")
+        """
+        Write the sections of this ticker and year to a staging folder, then swap them
+        in place of any previous run's sections together with a manifest, so re-runs
+        replace files instead of appending to them.
+        """
+        ticker_folder = os.path.join(self.text_data_path, self.ticker)
+        # Years of the same ticker are processed concurrently
+        os.makedirs(ticker_folder, exist_ok=True)
+        staging_folder = tempfile.mkdtemp(
+            prefix=f".staging_{self.ticker}_{self.year}_", dir=self.text_data_path
+        )
+        try:
+            sections = []
+            for i, text in enumerate(md_header_splits):
+                text_content = text.page_content
+                if text.metadata:
+                    header_name = text.metadata["Header 1"]
+                    file_name = f"14A_{self.ticker}_{self.year}_{i:03d}_{header_name}.txt"
+                else:
+                    header_name = None
+                    file_name = f"14A_{self.ticker}_{self.year}_{i:03d}.txt"
+                encoded_content = text_content.encode("utf-8")
+                with open(os.path.join(staging_folder, file_name), "wb") as output_file:
+                    output_file.write(encoded_content)
+                sections.append(
+                    {
+                        "file_name": file_name,
+                        "section": header_name,
+                        "bytes": len(encoded_content),
+                        "sha256": hashlib.sha256(encoded_content).hexdigest(),
+                    }
+                )
+                logging.info(f"Processed {i}")
+            manifest = {
+                "ticker": self.ticker,
+                "year": self.year,
+                "created_at": datetime.datetime.now().isoformat(),
+                "sections": sections,
+            }
+            manifest_file = section_manifest_path(ticker_folder, self.ticker, self.year)
+            with open(
+                os.path.join(staging_folder, os.path.basename(manifest_file)), "w"
+            ) as output_file:
+                json.dump(manifest, output_file, indent=4)
+
+            # Swap: mark the swap and withdraw the previous manifest first, so that an
+            # interrupted swap is detected by the ingestion instead of loading a mix
+            # of sections, then replace the sections and publish the manifest last.
+            # The flat text_data/<ticker>/<file> layout is kept, S3 keys and citations
+            # are derived from it.
+            swap_marker = section_swap_marker_path(ticker_folder, self.ticker, self.year)
+            with open(swap_marker, "w") as marker_file:
+                marker_file.write(datetime.datetime.now().isoformat())
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+            previous_files = glob.glob(
+                os.path.join(ticker_folder, f"14A_{self.ticker}_{self.year}_*.txt")
+            )
+            new_files = {section["file_name"] for section in sections}
+            for previous_file in previous_files:
+                # Files kept by the new run are replaced atomically below
+                if os.path.basename(previous_file) not in new_files:
+                    os.remove(previous_file)
+            for section in sections:
+                os.replace(
+                    os.path.join(staging_folder, section["file_name"]),
+                    os.path.join(ticker_folder, section["file_name"]),
+                )
+            os.replace(
+                os.path.join(staging_folder, os.path.basename(manifest_file)),
+                manifest_file,
+            )
+            os.remove(swap_marker)
+            logging.info(
+                f"Wrote {len(sections)} sections and manifest {manifest_file}, "
+                f"replacing {len(previous_files)} previous files"
+            )
+        finally:
+            shutil.rmtree(staging_folder, ignore_errors=True)
         return {"status_code": 200}
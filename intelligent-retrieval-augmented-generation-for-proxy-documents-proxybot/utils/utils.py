@@ -1,13 +1,43 @@
 import os
 import re
+import json
+import math
 import time
+import random
 import shutil
-import os
+import threading
+from botocore.exceptions import ClientError
 from parameters.logger import get_logger
 
 
 logging = get_logger(__name__)
 
+# Error codes of AWS API calls worth retrying, any other ClientError is permanent
+TRANSIENT_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "ProvisionedThroughputExceededException",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "InternalServerError",
+    "InternalServerException",
+    "InternalFailure",
+}
+
+
+def is_transient_error(error, retry_on):
+    """
+    Return True when error is one of the retry_on exception types. A ClientError is
+    only transient with one of the TRANSIENT_ERROR_CODES.
+    """
+    if not isinstance(error, retry_on):
+        return False
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in TRANSIENT_ERROR_CODES
+    return True
+
 
 def strip_tag(text, tag):
     text = re.sub(f"\n", "<BR>", text)
@@ -32,6 +62,83 @@ def timer(message=""):
     return time_executor
 
 
+def wait_until(
+    condition,
+    description,
+    timeout=900,
+    initial_delay=1,
+    max_delay=30,
+    backoff=2,
+    retry_on=(),
+):
+    """
+    Poll a readiness condition with exponential backoff, jitter and an overall deadline.
+    Transient exceptions raised by the condition, see is_transient_error, are logged
+    and treated as not ready yet, any other exception is raised at once.
+    Args:
+        condition (callable): returns a truthy value once the resource is ready.
+        description (str): name of the awaited resource, used for logging.
+        timeout (float): overall deadline in seconds.
+        initial_delay (float): first delay between polls in seconds.
+        max_delay (float): upper bound of the delay between polls in seconds.
+        backoff (float): multiplier applied to the delay after each poll.
+        retry_on (tuple): exception types the condition may raise while the resource
+            is not ready, e.g. NotFoundError or a throttling ClientError.
+    Returns:
+        The truthy value returned by the condition.
+    Raises:
+        TimeoutError: if the resource is not ready before the deadline.
+    """
+    start_time = time.time()
+    deadline = start_time + timeout
+    delay = initial_delay
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            result = condition()
+        except Exception as error:
+            if not is_transient_error(error, retry_on):
+                raise
+            logging.warning(f"Waiting for {description}, retrying after: {error}")
+            result = None
+        if result:
+            logging.info(
+                f"{description} ready after {time.time() - start_time:.2f}s "
+                f"and {attempts} checks"
+            )
+            return result
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise TimeoutError(
+                f"{description} not ready after {timeout}s and {attempts} checks"
+            )
+        # Full jitter keeps concurrent waiters from polling in lockstep
+        sleep_time = min(random.uniform(0, delay), remaining)  # nosec - jitter only
+        time.sleep(sleep_time)
+        delay = min(delay * backoff, max_delay)
+
+
+# Rough characters per token of the Claude and Titan tokenizers on English prose
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens of a text without calling a tokenizer."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut a text to about max_tokens tokens, on a word boundary where possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    truncated = text[:max_chars]
+    return truncated.rsplit(" ", 1)[0] if " " in truncated else truncated
+
+
 def fix_character_rendering(text):
     characters_dict = {
         "$": "\\$",
@@ -72,6 +179,63 @@ def get_raw_data(file_path):
     return data
 
 
+def section_manifest_path(ticker_folder, ticker, year):
+    return os.path.join(ticker_folder, f"14A_{ticker}_{year}_manifest.json")
+
+
+def section_swap_marker_path(ticker_folder, ticker, year):
+    """Present while the sections of a ticker and year are being replaced."""
+    return os.path.join(ticker_folder, f"14A_{ticker}_{year}_swap_in_progress")
+
+
+def load_section_manifest(ticker_folder, ticker, year):
+    """
+    Load the manifest written with the Textract sections of a ticker and year.
+    Returns None when the sections were written without a manifest.
+    Raises RuntimeError when a previous swap of the sections was interrupted, the
+    folder then holds a mix of old and new sections.
+    """
+    if os.path.exists(section_swap_marker_path(ticker_folder, ticker, year)):
+        raise RuntimeError(
+            f"Replacing the {ticker} {year} sections in {ticker_folder} was interrupted, "
+            f"run 05_run_relinearize.py or 02_run_textract.py again"
+        )
+    manifest_file = section_manifest_path(ticker_folder, ticker, year)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r") as file:
+        return json.load(file)
+
+
+ingestion_stamps_lock = threading.Lock()
+
+
+def load_ingestion_stamps(stamps_path):
+    """
+    Load the time of the last ingestion of each ticker and document date,
+    keyed by "{ticker}_{document_date}". Returns an empty dict before the first ingestion.
+    """
+    if not os.path.exists(stamps_path):
+        return {}
+    try:
+        with open(stamps_path, "r") as file:
+            return json.load(file)
+    except ValueError:
+        return {}
+
+
+def record_ingestion(ticker, document_date, stamps_path):
+    """Stamp a ticker and document date as re-ingested, invalidating its cached answers."""
+    with ingestion_stamps_lock:
+        os.makedirs(os.path.dirname(stamps_path), exist_ok=True)
+        stamps = load_ingestion_stamps(stamps_path)
+        stamps[f"{ticker}_{document_date}"] = time.time()
+        temp_path = f"{stamps_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(stamps, file)
+        os.replace(temp_path, stamps_path)
+
+
 def human_readable_size(size, decimal_places=2):
     for unit in ["B", "KB", "MB", "GB", "TB", "PB"]:
         if size < 1024.0:
@@ -0,0 +1,2 @@
+from vectorstore.local_store import LocalVectorStore
+from vectorstore.factory import create_vector_store_client, commit_vector_store
@@ -0,0 +1,36 @@
+from parameters.logger import get_logger
+from parameters.parameters import vector_store_dict, aoss_params
+from vectorstore.local_store import LocalVectorStore
+from logics.aossclient import create_aoss_client
+
+
+logging = get_logger(__name__)
+
+_local_store = None
+
+
+def create_vector_store_client(session):
+    """
+    Return the vector store client and index name selected by `[vector_store] backend`.
+    "aoss" builds an OpenSearch Serverless client, "local" the file backed LocalVectorStore,
+    both answer the same indices, bulk and search calls.
+    """
+    global _local_store
+    backend = vector_store_dict["backend"]
+    if backend == "local":
+        if _local_store is None:
+            _local_store = LocalVectorStore(vector_store_dict["local_path"])
+            logging.info(f"Using local vector store in {vector_store_dict['local_path']}")
+        return _local_store, aoss_params["index_name"]
+    if backend == "aoss":
+        return create_aoss_client(session)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def commit_vector_store(client, index):
+    """
+    Make the bulk changes of index durable, called once per ingestion unit.
+    A no-op for "aoss", OpenSearch Serverless persists every bulk request.
+    """
+    if vector_store_dict["backend"] == "local":
+        client.commit(index)
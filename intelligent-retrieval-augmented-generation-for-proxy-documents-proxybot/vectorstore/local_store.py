@@ -0,0 +1,410 @@
+import os
+import re
+import json
+import math
+import uuid
+import threading
+import numpy as np
+from collections import Counter
+from opensearchpy import exceptions
+from parameters.logger import get_logger
+from parameters.parameters import check_folder_exists
+
+
+logging = get_logger(__name__)
+
+VECTOR_FIELD = "vector_title"
+TEXT_FIELD = "page_content"
+# BM25 parameters of OpenSearch
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+class LocalIndex:
+    def __init__(self, folder):
+        """
+        One index of the local vector store, held in memory and persisted to folder.
+        Vectors are a float32 matrix saved as .npy and memory mapped on load, the
+        other fields are kept as JSON next to it. Bulk changes only mark the index
+        dirty, it is written on the next indices.refresh(). Deleted rows are masked
+        out of searches and dropped from the arrays when the index is saved.
+        :param folder: folder of the index files
+        """
+        self.folder = folder
+        self.mapping = {}
+        self.ids = []
+        self.rows = {}
+        self.deleted_rows = set()
+        self.sources = []
+        self.vectors = None
+        self.pending_vectors = []
+        self.version = None
+        self.term_counts = None
+        self.dirty = False
+
+    @property
+    def _mapping_path(self):
+        return os.path.join(self.folder, "mapping.json")
+
+    @property
+    def _documents_path(self):
+        return os.path.join(self.folder, "documents.json")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.folder, "vectors.npy")
+
+    def exists(self):
+        return os.path.exists(self._mapping_path)
+
+    def _stored_version(self):
+        if not os.path.exists(self._documents_path):
+            return None
+        file_stat = os.stat(self._documents_path)
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    def load(self):
+        """Reload the index when another process has written it since the last load."""
+        version = self._stored_version()
+        # Unsaved changes of this process win over the files
+        if self.dirty or version is None or version == self.version:
+            return
+        with open(self._mapping_path, "r") as file:
+            self.mapping = json.load(file)
+        with open(self._documents_path, "r") as file:
+            documents = json.load(file)
+        self.ids = [document["_id"] for document in documents]
+        self.rows = {document_id: row for row, document_id in enumerate(self.ids)}
+        self.deleted_rows = set()
+        self.sources = [document["_source"] for document in documents]
+        self.vectors = (
+            np.load(self._vectors_path, mmap_mode="r")
+            if os.path.exists(self._vectors_path)
+            else None
+        )
+        self.version = version
+        self.term_counts = None
+
+    def append(self, document_id, source, vector):
+        """Add a document, its vector is buffered until the next commit_vectors."""
+        self.rows[document_id] = len(self.ids)
+        self.ids.append(document_id)
+        self.sources.append(source)
+        self.pending_vectors.append(vector)
+        self.term_counts = None
+
+    def update(self, row, source, vector):
+        committed_rows = 0 if self.vectors is None else len(self.vectors)
+        if row >= committed_rows:
+            self.pending_vectors[row - committed_rows] = vector
+        else:
+            if not self.vectors.flags.writeable:
+                # Copied once from the memory mapped file
+                self.vectors = np.array(self.vectors)
+            self.vectors[row] = np.asarray(vector, dtype=np.float32)
+        self.sources[row] = source
+        self.term_counts = None
+
+    def delete(self, document_id):
+        """Mask the row of a document, return False when it is not indexed."""
+        row = self.rows.pop(document_id, None)
+        if row is None:
+            return False
+        self.deleted_rows.add(row)
+        return True
+
+    def compact(self):
+        """Drop the deleted rows from the arrays."""
+        if not self.deleted_rows:
+            return
+        self.commit_vectors()
+        kept_rows = [row for row in range(len(self.ids)) if row not in self.deleted_rows]
+        self.ids = [self.ids[row] for row in kept_rows]
+        self.sources = [self.sources[row] for row in kept_rows]
+        self.vectors = np.asarray(self.vectors)[kept_rows]
+        self.rows = {document_id: row for row, document_id in enumerate(self.ids)}
+        self.deleted_rows = set()
+        self.term_counts = None
+
+    def commit_vectors(self):
+        if not self.pending_vectors:
+            return
+        rows = np.asarray(self.pending_vectors, dtype=np.float32)
+        self.vectors = rows if self.vectors is None else np.concatenate([self.vectors, rows])
+        self.pending_vectors = []
+
+    def save(self):
+        self.compact()
+        self.commit_vectors()
+        check_folder_exists(self.folder)
+        with open(f"{self._mapping_path}.tmp", "w") as file:
+            json.dump(self.mapping, file)
+        os.replace(f"{self._mapping_path}.tmp", self._mapping_path)
+        if self.vectors is not None:
+            # np.save appends .npy to names without it
+            temp_path = f"{self.folder}/vectors.tmp.npy"
+            np.save(temp_path, np.asarray(self.vectors, dtype=np.float32))
+            os.replace(temp_path, self._vectors_path)
+        documents = [
+            {"_id": document_id, "_source": source}
+            for document_id, source in zip(self.ids, self.sources)
+        ]
+        with open(f"{self._documents_path}.tmp", "w") as file:
+            json.dump(documents, file)
+        # Written last, readers reload on its change
+        os.replace(f"{self._documents_path}.tmp", self._documents_path)
+        self.version = self._stored_version()
+        self.dirty = False
+
+    def vector_dimension(self):
+        properties = self.mapping.get("mappings", {}).get("properties", {})
+        return properties.get(VECTOR_FIELD, {}).get("dimension")
+
+
+class LocalIndices:
+    def __init__(self, store):
+        self.store = store
+
+    def exists(self, index):
+        return self.store._index(index).exists()
+
+    def create(self, index, body=None):
+        with self.store.lock:
+            local_index = self.store._index(index)
+            if local_index.exists():
+                raise exceptions.RequestError(
+                    400, "resource_already_exists_exception", f"index [{index}] already exists"
+                )
+            local_index.mapping = body or {}
+            local_index.save()
+        logging.info(f"Created local index {index}")
+        return {"acknowledged": True, "index": index}
+
+    def refresh(self, index=None):
+        """Persist the bulk changes of index, or of all indices when None."""
+        with self.store.lock:
+            if index is None:
+                local_indices = list(self.store.indices_cache.values())
+            else:
+                local_indices = [self.store._existing_index(index)]
+            for local_index in local_indices:
+                if local_index.dirty:
+                    local_index.save()
+                    logging.info(f"Persisted local index {local_index.folder}")
+        return {"_shards": {"failed": 0}}
+
+    def get_mapping(self, index):
+        local_index = self.store._existing_index(index)
+        return {index: {"mappings": local_index.mapping.get("mappings", {})}}
+
+    def delete(self, index):
+        with self.store.lock:
+            local_index = self.store._existing_index(index)
+            for path in (
+                local_index._mapping_path,
+                local_index._documents_path,
+                local_index._vectors_path,
+            ):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.store.indices_cache.pop(index, None)
+        return {"acknowledged": True}
+
+
+class LocalVectorStore:
+    def __init__(self, path):
+        """
+        Drop-in for the subset of the OpenSearch client used by ProxyBot, backed by
+        local files. It supports indices.exists/create/get_mapping/delete, bulk index
+        and delete actions, and search with a kNN or BM25 match query, term filters,
+        size and _source filtering. kNN search is an exact cosine similarity scan.
+        Bulk changes are searchable at once but only written to disk by commit()
+        or indices.refresh(), so an ingestion rewrites the files once per unit.
+        :param path: folder holding one sub folder per index
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        self.indices_cache = {}
+        self.indices = LocalIndices(self)
+
+    def commit(self, index):
+        """Persist the bulk changes of index, called once per ingestion unit."""
+        return self.indices.refresh(index=index)
+
+    def _index(self, index):
+        with self.lock:
+            if index not in self.indices_cache:
+                self.indices_cache[index] = LocalIndex(os.path.join(self.path, index))
+            return self.indices_cache[index]
+
+    def _existing_index(self, index):
+        local_index = self._index(index)
+        if not local_index.exists():
+            raise exceptions.NotFoundError(
+                404, "index_not_found_exception", f"no such index [{index}]"
+            )
+        with self.lock:
+            local_index.load()
+        return local_index
+
+    def bulk(self, body, index=None):
+        """Apply newline delimited index and delete actions, as the _bulk API does."""
+        lines = [line for line in body.splitlines() if line.strip()]
+        items = []
+        with self.lock:
+            position = 0
+            while position < len(lines):
+                action = json.loads(lines[position])
+                op_type, metadata = next(iter(action.items()))
+                index_name = metadata.get("_index", index)
+                local_index = self._existing_index(index_name)
+                local_index.dirty = True
+                if op_type in ("index", "create"):
+                    document = json.loads(lines[position + 1])
+                    position += 2
+                    items.append(
+                        {op_type: self._index_document(local_index, metadata, document)}
+                    )
+                elif op_type == "delete":
+                    position += 1
+                    items.append({"delete": self._delete_document(local_index, metadata)})
+                else:
+                    raise exceptions.RequestError(
+                        400, "illegal_argument_exception", f"unsupported action {op_type}"
+                    )
+        return {
+            "errors": any(next(iter(item.values()))["status"] >= 300 for item in items),
+            "items": items,
+        }
+
+    def _index_document(self, local_index, metadata, document):
+        document_id = metadata.get("_id")
+        vector = document.pop(VECTOR_FIELD, None)
+        dimension = local_index.vector_dimension()
+        if vector is None or (dimension and len(vector) != dimension):
+            return {
+                "_id": document_id,
+                "status": 400,
+                "error": {
+                    "type": "mapper_parsing_exception",
+                    "reason": f"invalid {VECTOR_FIELD}",
+                },
+            }
+        if document_id is not None and document_id in local_index.rows:
+            local_index.update(local_index.rows[document_id], document, vector)
+            return {"_id": document_id, "status": 200, "result": "updated"}
+        document_id = document_id or uuid.uuid4().hex
+        local_index.append(document_id, document, vector)
+        return {"_id": document_id, "status": 201, "result": "created"}
+
+    def _delete_document(self, local_index, metadata):
+        document_id = metadata["_id"]
+        if not local_index.delete(document_id):
+            return {"_id": document_id, "status": 404, "result": "not_found"}
+        return {"_id": document_id, "status": 200, "result": "deleted"}
+
+    @staticmethod
+    def _filter_mask(sources, filters):
+        mask = np.ones(len(sources), dtype=bool)
+        for query_filter in filters:
+            field, value = next(iter(query_filter["term"].items()))
+            # Compared as keyword fields are, the ingestion stores document_date as an int
+            # and the searches filter on its string
+            mask &= np.array(
+                [
+                    field in source and str(source[field]) == str(value)
+                    for source in sources
+                ],
+                dtype=bool,
+            )
+        return mask
+
+    @staticmethod
+    def _knn_scores(local_index, candidates, knn):
+        field, knn_query = next(iter(knn.items()))
+        if field != VECTOR_FIELD or local_index.vectors is None:
+            return np.zeros(len(candidates), dtype=np.float32)
+        query = np.asarray(knn_query["vector"], dtype=np.float32)
+        vectors = np.asarray(local_index.vectors[candidates])
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+        # Mapped into (0, 1] like the cosinesimil space of OpenSearch
+        return (1 + (vectors @ query) / np.maximum(norms, 1e-12)) / 2
+
+    @staticmethod
+    def _bm25_scores(local_index, candidates, match):
+        field, text = next(iter(match.items()))
+        if isinstance(text, dict):
+            text = text["query"]
+        if local_index.term_counts is None:
+            local_index.term_counts = [
+                Counter(tokenize(source.get(TEXT_FIELD, ""))) for source in local_index.sources
+            ]
+        term_counts = [local_index.term_counts[position] for position in candidates]
+        lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+        average_length = max(float(lengths.mean()), 1.0) if len(lengths) else 1.0
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        for term in set(tokenize(text)):
+            frequencies = np.array([counts[term] for counts in term_counts], dtype=np.float32)
+            document_frequency = int((frequencies > 0).sum())
+            if not document_frequency:
+                continue
+            idf = math.log(1 + (len(candidates) - document_frequency + 0.5) / (document_frequency + 0.5))
+            scores += idf * frequencies * (BM25_K1 + 1) / (
+                frequencies + BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+            )
+        return scores
+
+    @staticmethod
+    def _project_source(source, source_filter):
+        if source_filter is True or source_filter is None:
+            return dict(source)
+        if source_filter is False:
+            return {}
+        if isinstance(source_filter, list):
+            return {field: source[field] for field in source_filter if field in source}
+        excludes = set(source_filter.get("excludes", []))
+        return {field: value for field, value in source.items() if field not in excludes}
+
+    def search(self, body, index):
+        local_index = self._existing_index(index)
+        bool_query = body.get("query", {}).get("bool", {})
+        filters = bool_query.get("filter", [])
+        if isinstance(filters, dict):
+            filters = [filters]
+        must = bool_query.get("must", {})
+        size = body.get("size", 10)
+        source_filter = body.get("_source", True)
+        with self.lock:
+            local_index.commit_vectors()
+            mask = self._filter_mask(local_index.sources, filters)
+            mask[list(local_index.deleted_rows)] = False
+            candidates = np.flatnonzero(mask)
+            if "knn" in must:
+                scores = self._knn_scores(local_index, candidates, must["knn"])
+                size = min(size, next(iter(must["knn"].values())).get("k", size))
+            elif "match" in must:
+                scores = self._bm25_scores(local_index, candidates, must["match"])
+                matched = scores > 0
+                candidates, scores = candidates[matched], scores[matched]
+            else:
+                scores = np.ones(len(candidates), dtype=np.float32)
+            hits = []
+            for position in np.argsort(-scores, kind="stable")[:size]:
+                row = candidates[position]
+                source = {
+                    **local_index.sources[row],
+                    VECTOR_FIELD: local_index.vectors[row].tolist(),
+                }
+                hits.append(
+                    {
+                        "_index": index,
+                        "_id": local_index.ids[row],
+                        "_score": float(scores[position]),
+                        "_source": self._project_source(source, source_filter),
+                    }
+                )
+        return {"hits": {"total": {"value": len(candidates)}, "hits": hits}}
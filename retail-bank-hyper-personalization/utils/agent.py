@@ -155,7 +155,11 @@ def generate_content(selected_model, customer, basic_segment, rfm_result, produc
     '''
     
     for attempt in range(retry_limit):
-        res = invoke_bedrock(selected_model, prompt)
+        try:
+            res = invoke_bedrock(selected_model, prompt)
+        except Exception as e:
+            print(f"Attempt {attempt + 1} failed to call Bedrock. Error: {e}. Retrying...")
+            continue
         print(res)
         
         xml_string = res
@@ -233,7 +237,11 @@ def review_content(selected_model, content, reviewed):
         !!! This content has been reviewed before. Please approve it as much as you can. !!!
         '''
     
-    res = invoke_bedrock(selected_model, prompt)
+    try:
+        res = invoke_bedrock(selected_model, prompt)
+    except Exception as e:
+        print(f"Review failed to call Bedrock. Error: {e}")
+        return {"result": "Rejected", "feedbacks": [f"The review could not be completed: {e}"]}
     
     print(res)
     
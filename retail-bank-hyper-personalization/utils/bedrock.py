@@ -1,5 +1,7 @@
 import json
 import boto3
+from functools import lru_cache
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 def fetch_model_ids():
@@ -19,8 +21,20 @@ def fetch_model_ids():
                     ]
     return model_ids
 
+# One client reused by the recommendation, content and review prompts
+@lru_cache(maxsize=1)
+def get_bedrock_runtime_client():
+    return boto3.client(
+        'bedrock-runtime',
+        region_name='us-west-2',
+        config=Config(
+            max_pool_connections=10,
+            retries={'max_attempts': 8, 'mode': 'adaptive'}
+        )
+    )
+
 def invoke_bedrock(model_id, prompt):
-    client = boto3.client('bedrock-runtime', region_name='us-west-2')
+    client = get_bedrock_runtime_client()
     
     # Create the request structure for the Converse API
     request = {
@@ -50,5 +64,6 @@ def invoke_bedrock(model_id, prompt):
         return response_text
 
     except (ClientError, Exception) as e:
+        # Raised to the caller, exiting would stop the whole Streamlit server
         print(f"ERROR: Can't invoke '{model_id}'. Reason: {e}")
-        exit(1)
\ No newline at end of file
+        raise
\ No newline at end of file